@@ -0,0 +1,94 @@
+"""Cold-start benchmark for pmt.py.
+
+Loads the app module (pmt.py, together with the pmt package it imports) in a
+fresh interpreter, compares the time against a bare ``import streamlit`` and fails when the overhead exceeds the budget or when one
+of the deferred charting/data modules is loaded eagerly.
+
+Usage:
+    python benchmarks/import_time.py [--budget SECONDS] [--repeat N]
+
+The budget defaults to ``PMT_IMPORT_BUDGET`` (seconds) or 0.25.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules pmt.py loads lazily; none of them may be imported at module load.
+DEFERRED_MODULES = [
+    "pandas",
+    "numpy",
+    "plotly.express",
+    "plotly.figure_factory",
+    "matplotlib",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+# pmt.py shares its name with the pmt package, so it is loaded by path
+STATEMENTS = {
+    "streamlit": "import streamlit",
+    "pmt": (
+        "import importlib.util; "
+        "spec = importlib.util.spec_from_file_location('pmt_app', 'pmt.py'); "
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))"
+    ),
+}
+
+
+def measure(module, db_path):
+    env = dict(os.environ, PMT_DATABASE=db_path)
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(statement=STATEMENTS[module])],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def best_of(module, db_path, repeat):
+    runs = [measure(module, db_path) for _ in range(repeat)]
+    return min(runs, key=lambda run: run["seconds"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float,
+                        default=float(os.environ.get("PMT_IMPORT_BUDGET", "0.25")),
+                        help="allowed import overhead over streamlit, in seconds")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "pmt.db")
+        baseline = best_of("streamlit", db_path, args.repeat)
+        app = best_of("pmt", db_path, args.repeat)
+
+    overhead = app["seconds"] - baseline["seconds"]
+    eager = [name for name in DEFERRED_MODULES if name in app["modules"]]
+
+    print(f"import streamlit: {baseline['seconds'] * 1000:8.1f} ms")
+    print(f"import pmt:       {app['seconds'] * 1000:8.1f} ms")
+    print(f"overhead:         {overhead * 1000:8.1f} ms (budget {args.budget * 1000:.0f} ms)")
+
+    failed = False
+    if eager:
+        print("eagerly imported: " + ", ".join(eager))
+        failed = True
+    if overhead > args.budget:
+        print("import overhead exceeds budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+"""Data-function and page-render benchmarks for pmt.py on a synthetic project.
+
+Builds a throwaway database with N partners, M tasks and the requested comment
+and notification density, times the pmt services and chart builders the pages
+are built from and every page render through Streamlit's AppTest (no browser),
+and writes the results to a JSON file. Pass an earlier result file with ``--compare`` to fail
+on regressions between revisions.
+
+Usage:
+    python benchmarks/suite.py [--partners N] [--tasks M] [--comments PER_TASK]
+                               [--notifications PER_PARTNER] [--reports PER_PARTNER]
+                               [--repeat N] [--seed N] [--output FILE]
+                               [--compare BASELINE] [--tolerance RATIO]
+                               [--min-delta MS] [--skip-pages]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pmt import Database, NotificationService, ReportService, SharedDataset, TaskService  # noqa: E402
+from pmt import charts, constants  # noqa: E402
+from pmt.auth import hash_password  # noqa: E402
+from pmt.dataset import TaskTable  # noqa: E402
+from pmt.services import compute_dashboard_metrics  # noqa: E402
+
+# Synthetic users all share this password; hashed cheaply so seeding stays fast.
+PASSWORD = "bench123"
+PASSWORD_COST = 2 ** 10
+
+PAGES = ["Dashboard", "Tasks", "Gantt Chart", "Reports", "Search"]
+
+# pmt.py shares its name with the pmt package, so the view is loaded by path
+APP_SCRIPT = """
+import importlib.util
+import sys
+sys.path.insert(0, {root!r})
+app = sys.modules.get("pmt_app")
+if app is None:
+    spec = importlib.util.spec_from_file_location("pmt_app", {view!r})
+    app = importlib.util.module_from_spec(spec)
+    sys.modules["pmt_app"] = app
+    spec.loader.exec_module(app)
+app.run_app()
+"""
+
+
+def partner_names(count):
+    return [f"Partner {i:03d}" for i in range(1, count + 1)]
+
+
+def username(partner):
+    return partner.lower().replace(" ", "")
+
+
+def generate_tasks(partners, count, comments_per_task, rng):
+    """count tasks spread over partners and +-1 year around today, with Poisson-ish comment threads"""
+    today = date.today()
+    tasks = []
+    for i in range(count):
+        partner = partners[i % len(partners)]
+        start = today + timedelta(days=rng.randint(-365, 365))
+        status = rng.choice(constants.TASK_STATUS)
+        comments = [
+            {
+                "user": rng.choice(partners),
+                "date": (start + timedelta(days=k)).isoformat(),
+                "text": f"Update {k + 1} on task {i + 1}: {rng.choice(constants.TASK_CATEGORIES).lower()} work"
+            }
+            for k in range(int(comments_per_task) + (rng.random() < comments_per_task % 1))
+        ]
+        tasks.append({
+            "title": f"Task {i + 1} for {partner}",
+            "description": f"Synthetic {status.lower()} task for {partner}",
+            "assigned_to": partner,
+            "assigned_by": partners[0],
+            "category": rng.choice(constants.TASK_CATEGORIES),
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=rng.randint(1, 90))).isoformat(),
+            "status": status,
+            "progress": 100 if status == "Completed" else rng.randint(0, 90),
+            "priority": rng.choice(constants.TASK_PRIORITIES),
+            "comments": comments
+        })
+    return tasks
+
+
+def generate_reports(partners, per_partner, rng):
+    today = date.today()
+    return [
+        {
+            "title": f"Report {k + 1} from {partner}",
+            "partner": partner,
+            "submission_date": (today - timedelta(days=14 * k)).isoformat(),
+            "period_start": (today - timedelta(days=14 * (k + 1))).isoformat(),
+            "period_end": (today - timedelta(days=14 * k)).isoformat(),
+            "activities_completed": f"Completed work {k + 1} for {partner}",
+            "activities_in_progress": "Ongoing work",
+            "activities_planned": "Planned work",
+            "issues": "",
+            "status": rng.choice(constants.REPORT_STATUS)
+        }
+        for partner in partners
+        for k in range(per_partner)
+    ]
+
+
+def generate_users(partners):
+    password_hash = hash_password(PASSWORD, n=PASSWORD_COST)
+    users = [{
+        "username": "admin",
+        "password": password_hash,
+        "role": "admin",
+        "organization": partners[0],
+        "name": "Administrator",
+        "email": "admin@example.org"
+    }]
+    users += [
+        {
+            "username": username(partner),
+            "password": password_hash,
+            "role": "partner",
+            "organization": partner,
+            "name": f"{partner} Representative",
+            "email": f"contact@{username(partner)}.example.org"
+        }
+        for partner in partners[1:]
+    ]
+    return users
+
+
+def generate_notifications(partners, per_partner, rng):
+    today = date.today()
+    return [
+        {
+            "user": partner,
+            "message": f"Synthetic notification {k + 1}",
+            "date": (today - timedelta(days=rng.randint(0, 120))).isoformat(),
+            "read": rng.random() < 0.5,
+            "type": rng.choice(["task_assignment", "report_reminder", "comment"])
+        }
+        for partner in partners
+        for k in range(per_partner)
+    ]
+
+
+def seed(store, args):
+    """Switch pmt to the synthetic partners and fill the (empty) store"""
+    rng = random.Random(args.seed)
+    partners = partner_names(args.partners)
+    # The partner list is a module constant that every page and the task
+    # snapshot read; swap its contents so they all see the synthetic partners.
+    constants.PARTNERS[:] = partners
+    store.seed(
+        generate_tasks(partners, args.tasks, args.comments, rng),
+        generate_reports(partners, args.reports, rng),
+        generate_users(partners),
+        generate_notifications(partners, args.notifications, rng),
+        []
+    )
+    return partners
+
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(runs), "min_ms": min(runs), "runs": repeat}
+
+
+def bench_functions(store, partners, repeat):
+    """Time the services and chart builders behind the pages, without a Streamlit runtime"""
+    dataset = SharedDataset(store)
+    notifications = NotificationService(store, dataset)
+    tasks = TaskService(store, dataset, notifications)
+    reports = ReportService(store, dataset, notifications)
+
+    partner_user = username(partners[1]) if len(partners) > 1 else "admin"
+    all_filters = {"status": constants.TASK_STATUS, "category": constants.TASK_CATEGORIES, "partners": partners}
+    results = {}
+
+    results["load_task_table"] = timed(lambda: TaskTable(store.task_table(TaskTable.FIELDS)), repeat)
+    table = dataset.task_table()
+    
+    # What a restart reads instead of the tasks table
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, "tasks.arrow")
+        table.save(snapshot, store.change_head(), store.database_id())
+        results["load_task_snapshot"] = timed(lambda: TaskTable.load(snapshot, store.database_id()), repeat)
+
+    results["get_user_tasks[admin]"] = timed(lambda: tasks.tasks("admin"), repeat)
+    results["get_user_tasks[partner]"] = timed(lambda: tasks.tasks(partner_user), repeat)
+    results["get_user_tasks[filtered]"] = timed(
+        lambda: tasks.tasks("admin", status=["In Progress", "Delayed"], partners=partners[:2]), repeat
+    )
+
+    # What display_tasks does per rerun: filter, sort, count and read one page
+    for sort_by in constants.TASK_SORT_OPTIONS.values():
+        results[f"display_tasks.query[{sort_by}]"] = timed(
+            lambda: (lambda q: (q.count(), q.page(0, constants.PAGE_SIZES[0])))(
+                tasks.query("admin", filters=all_filters, sort_by=sort_by, ascending=False)
+            ),
+            repeat
+        )
+
+    results["compute_dashboard_metrics"] = timed(lambda: compute_dashboard_metrics(tasks, reports), repeat)
+    status_counts = tasks.status_counts()
+    results["partner_task_distribution"] = timed(lambda: charts.partner_task_distribution(status_counts), repeat)
+
+    shown = tasks.tasks("admin").sorted_by("start_date")[:constants.GANTT_MAX_TASKS]
+    results["create_gantt_chart"] = timed(lambda: charts.create_gantt_chart(shown), repeat)
+
+    # What the comment panels and the notification sidebar read; these grow with
+    # --comments and --notifications
+    task_id = tasks.tasks("admin")[0]["id"]
+    results["list_comment_threads"] = timed(
+        lambda: dataset.view("admin").comment_threads(task_id, constants.COMMENT_PAGE_SIZE), repeat
+    )
+    for login, label in (("admin", "admin"), (partner_user, "partner")):
+        results[f"search_comments[{label}]"] = timed(
+            lambda: (lambda view: (view.count_comment_matches("update work"),
+                                   view.search_comments("update work", limit=constants.PAGE_SIZES[0])))(
+                dataset.view(login)
+            ),
+            repeat
+        )
+    results["unread_count"] = timed(lambda: notifications.unread_count(partners[-1]), repeat)
+    results["list_notifications"] = timed(
+        lambda: notifications.notifications(
+            username(partners[-1]), unread_only=True, limit=constants.NOTIFICATION_SIDEBAR_LIMIT
+        ),
+        repeat
+    )
+
+    task = {
+        "title": "Benchmark task",
+        "description": "Added by the benchmark suite",
+        "assigned_to": partners[-1],
+        "assigned_by": partners[0],
+        "category": constants.TASK_CATEGORIES[0],
+        "start_date": date.today().isoformat(),
+        "end_date": (date.today() + timedelta(days=7)).isoformat(),
+        "status": "Not Started",
+        "progress": 0,
+        "priority": "Medium"
+    }
+    results["add_task"] = timed(lambda: tasks.add(task), repeat)
+
+    statuses = iter(constants.TASK_STATUS * repeat)
+    results["edit_task"] = timed(lambda: tasks.edit(task_id, {"status": next(statuses)}), repeat)
+    # First read after a write replays the change onto the shared snapshot
+    results["get_user_tasks[after write]"] = timed(
+        lambda: (tasks.edit(task_id, {"progress": 50}), tasks.tasks("admin")), repeat
+    )
+    return results
+
+
+def bench_pages(partners, repeat):
+    """Time full page reruns through AppTest, for the admin and for one partner"""
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    logins = [("admin", "admin")]
+    if len(partners) > 1:
+        logins.append((username(partners[1]), "partner"))
+
+    for login, label in logins:
+        app = AppTest.from_string(
+            APP_SCRIPT.format(root=ROOT, view=os.path.join(ROOT, "pmt.py")), default_timeout=600
+        )
+        app.run()
+        app.text_input[0].input(login)
+        app.text_input[1].input(PASSWORD)
+        app.button(key="login_button").click().run()
+        app.run()
+        if not app.session_state["logged_in"]:
+            raise RuntimeError(f"benchmark login failed for {login}")
+
+        for page in PAGES:
+            app.sidebar.selectbox[0].select(page)
+            results[f"page[{label}:{page}]"] = timed(app.run, repeat)
+            if app.exception:
+                raise RuntimeError(f"{page} raised: {app.exception[0].message}")
+    return results
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """Names whose median grew by more than tolerance and min_delta ms over the baseline"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else 1.0
+        marker = ""
+        if ratio > 1 + tolerance and result["median_ms"] - before["median_ms"] > min_delta:
+            regressions.append(name)
+            marker = "  REGRESSION"
+        print(f"{name:45s} {before['median_ms']:10.2f} -> {result['median_ms']:10.2f} ms ({ratio:5.2f}x){marker}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--partners", type=int, default=7)
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--comments", type=float, default=0.5, help="average comments per task")
+    parser.add_argument("--notifications", type=int, default=50, help="notifications per partner")
+    parser.add_argument("--reports", type=int, default=26, help="reports per partner")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-pages", action="store_true", help="only time the data functions")
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results.json"))
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown over the baseline median, as a ratio")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="slowdowns smaller than this many ms are never regressions")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pmt.db")
+        store = Database(path)
+
+        start = time.perf_counter()
+        partners = seed(store, args)
+        seed_seconds = time.perf_counter() - start
+
+        results = bench_functions(store, partners, args.repeat)
+        if not args.skip_pages:
+            # pmt.py reads its database path when it is loaded
+            os.environ["PMT_DATABASE"] = path
+            results.update(bench_pages(partners, args.repeat))
+
+    report = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "parameters": {
+            "partners": args.partners,
+            "tasks": args.tasks,
+            "comments": args.comments,
+            "notifications": args.notifications,
+            "reports": args.reports,
+            "repeat": args.repeat,
+            "seed": args.seed
+        },
+        "seed_seconds": seed_seconds,
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in results.items():
+        print(f"{name:45s} {result['median_ms']:10.2f} ms (min {result['min_ms']:.2f})")
+    print(f"wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("parameters") != report["parameters"]:
+            print("warning: baseline was recorded with different parameters")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
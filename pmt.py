@@ -1,19 +1,31 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.figure_factory as ff
 from datetime import datetime, timedelta
-import json
-import io
-import base64
+import csv
+import html
+import math
 import os
-import uuid
-from PIL import Image
-import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.colors import LinearSegmentedColormap
-import calendar
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from pmt.auth import Identity, dummy_password_hash
+from pmt.charts import (
+    category_share_chart, create_gantt_chart, create_rollup_gantt_chart, partner_task_distribution,
+    report_submission_chart, task_category_chart, task_priority_chart, task_progress_chart
+)
+from pmt.constants import (
+    COMMENT_PAGE_SIZE, DASHBOARD_RECENT_ITEMS, DATE_FORMAT_CACHE_SIZE, EXPORT_MIME_TYPES, FIGURE_CACHE_SIZE,
+    FRAME_CACHE_SIZE, GANTT_LEVELS, GANTT_MAX_TASKS, NOTIFICATION_SIDEBAR_LIMIT,
+    PAGE_SIZES, PARTNERS, PASSWORD_HASH_WORKERS, SEARCH_MARKS, TASK_CATEGORIES, TASK_SORT_OPTIONS, TASK_STATUS
+)
+from pmt.dataset import SharedDataset, VersionedCache
+from pmt.events import NotificationQueue
+from pmt.lazy import pd, px
+from pmt.services import (
+    AuthService, NotificationService, ReportService, TaskService, compute_dashboard_metrics, prepare_database
+)
+from pmt.store import SEARCH_COLUMNS, TASK_FIELDS, Database, EditConflict
+from pmt.tracing import TRACER, traced
+from pmt.transfer import export_formats, parse_import
 
 # Set page configuration
 st.set_page_config(
@@ -85,34 +97,54 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Constants
-PARTNERS = [
-    "Yildiz Technical University (YTU)",
-    "THE NEW WAY",
-    "Ss. Cyril and Methodius University in Skopje",
-    "Politecnico da Guarda",
-    "HOCHSCHULE MAGDEBURG-STENDAL",
-    "Center for the Promotion of Science",
-    "Daugavpils Universitate"
-]
+DATABASE_PATH = os.environ.get("PMT_DATABASE", "pmt.db")
 
-TASK_CATEGORIES = [
-    "Project Management",
-    "Research",
-    "Development",
-    "Implementation",
-    "Dissemination",
-    "Quality Assurance",
-    "Reporting"
-]
+# Helper functions
+@st.cache_resource
+def get_password_hasher():
+    """Worker threads for the password KDF; at most PASSWORD_HASH_WORKERS hashes run at once"""
+    executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pmt-password")
+    # Hash the stand-in for unknown usernames now rather than during a login
+    executor.submit(dummy_password_hash)
+    return executor
 
-TASK_STATUS = ["Not Started", "In Progress", "Completed", "Delayed", "Cancelled"]
+@st.cache_resource
+def get_database():
+    db = Database(DATABASE_PATH)
+    prepare_database(db, AuthService(db, get_password_hasher()))
+    return db
+
+@st.cache_resource
+def get_auth_service():
+    """Shared by every session, so failed logins are counted across sessions"""
+    return AuthService(get_database(), get_password_hasher())
+
+@st.cache_resource
+def get_dataset():
+    return SharedDataset(get_database(), snapshot_path=f"{DATABASE_PATH}-tasks.arrow")
+
+@st.cache_resource
+def get_notification_service():
+    return NotificationService(get_database(), get_dataset(), NotificationQueue(get_database()))
+
+@st.cache_resource
+def get_task_service():
+    return TaskService(get_database(), get_dataset(), get_notification_service())
+
+@st.cache_resource
+def get_report_service():
+    return ReportService(get_database(), get_dataset(), get_notification_service())
+
+@st.cache_resource
+def get_figure_cache():
+    return VersionedCache(FIGURE_CACHE_SIZE)
+
+@st.cache_resource
+def get_frame_cache():
+    return VersionedCache(FRAME_CACHE_SIZE)
 
-# Helper functions
 def init_session_state():
-    if 'data_loaded' not in st.session_state:
-        st.session_state.data_loaded = False
-    
+    # Only login state lives in the session; project data is shared via get_dataset()
     if 'logged_in' not in st.session_state:
         st.session_state.logged_in = False
     
@@ -122,563 +154,115 @@ def init_session_state():
     if 'is_admin' not in st.session_state:
         st.session_state.is_admin = False
     
-    if 'tasks' not in st.session_state:
-        # Create sample data
-        st.session_state.tasks = create_sample_tasks()
-        
-    if 'reports' not in st.session_state:
-        st.session_state.reports = create_sample_reports()
-    
-    if 'users' not in st.session_state:
-        st.session_state.users = create_sample_users()
-        
-    if 'notifications' not in st.session_state:
-        st.session_state.notifications = create_sample_notifications()
-    
-    if 'documents' not in st.session_state:
-        st.session_state.documents = create_sample_documents()
+    if 'identity' not in st.session_state:
+        st.session_state.identity = None
 
-def create_sample_tasks():
-    today = datetime.now().date()
-    tasks = []
-    
-    # Create a set of tasks for each partner
-    for i, partner in enumerate(PARTNERS):
-        # Past tasks
-        for j in range(3):
-            start_date = today - timedelta(days=90-j*10)
-            end_date = start_date + timedelta(days=15)
-            tasks.append({
-                "id": f"task_{len(tasks)+1}",
-                "title": f"Past Task {j+1} for {partner}",
-                "description": f"A completed task for {partner}",
-                "assigned_to": partner,
-                "assigned_by": "Yildiz Technical University (YTU)" if partner != "Yildiz Technical University (YTU)" else "THE NEW WAY",
-                "category": TASK_CATEGORIES[j % len(TASK_CATEGORIES)],
-                "start_date": start_date.strftime("%Y-%m-%d"),
-                "end_date": end_date.strftime("%Y-%m-%d"),
-                "status": "Completed",
-                "progress": 100,
-                "priority": "High" if j == 0 else "Medium" if j == 1 else "Low",
-                "comments": []
-            })
-        
-        # Current tasks
-        for j in range(2):
-            start_date = today - timedelta(days=15-j*5)
-            end_date = today + timedelta(days=15+j*5)
-            tasks.append({
-                "id": f"task_{len(tasks)+1}",
-                "title": f"Current Task {j+1} for {partner}",
-                "description": f"An ongoing task for {partner}",
-                "assigned_to": partner,
-                "assigned_by": "Yildiz Technical University (YTU)" if partner != "Yildiz Technical University (YTU)" else "THE NEW WAY",
-                "category": TASK_CATEGORIES[(j+3) % len(TASK_CATEGORIES)],
-                "start_date": start_date.strftime("%Y-%m-%d"),
-                "end_date": end_date.strftime("%Y-%m-%d"),
-                "status": "In Progress",
-                "progress": 50 + j*20,
-                "priority": "High" if j == 0 else "Medium",
-                "comments": []
-            })
-        
-        # Future tasks
-        for j in range(3):
-            start_date = today + timedelta(days=30+j*15)
-            end_date = start_date + timedelta(days=20)
-            tasks.append({
-                "id": f"task_{len(tasks)+1}",
-                "title": f"Future Task {j+1} for {partner}",
-                "description": f"A planned task for {partner}",
-                "assigned_to": partner,
-                "assigned_by": "Yildiz Technical University (YTU)" if partner != "Yildiz Technical University (YTU)" else "THE NEW WAY",
-                "category": TASK_CATEGORIES[(j+5) % len(TASK_CATEGORIES)],
-                "start_date": start_date.strftime("%Y-%m-%d"),
-                "end_date": end_date.strftime("%Y-%m-%d"),
-                "status": "Not Started",
-                "progress": 0,
-                "priority": "Medium" if j == 0 else "Low",
-                "comments": []
-            })
-    
-    return tasks
+@traced()
+def get_user_tasks(username, status=None, category=None, partners=None, due_from=None):
+    return get_task_service().tasks(username, status, category, partners, due_from)
 
-def create_sample_reports():
-    today = datetime.now().date()
-    reports = []
-    
-    for i, partner in enumerate(PARTNERS):
-        for j in range(6):
-            report_date = today - timedelta(days=(6-j)*14)
-            reports.append({
-                "id": f"report_{len(reports)+1}",
-                "title": f"Biweekly Report {j+1}",
-                "partner": partner,
-                "submission_date": report_date.strftime("%Y-%m-%d"),
-                "period_start": (report_date - timedelta(days=14)).strftime("%Y-%m-%d"),
-                "period_end": report_date.strftime("%Y-%m-%d"),
-                "activities_completed": f"Completed activities for {partner} in period {j+1}",
-                "activities_in_progress": f"Ongoing activities for {partner} in period {j+1}",
-                "activities_planned": f"Planned activities for {partner} in period {j+1}",
-                "issues": f"Issues encountered by {partner} in period {j+1}" if j % 3 == 0 else "",
-                "status": "Submitted" if j < 5 else "Draft" if partner == "Yildiz Technical University (YTU)" else "Pending"
-            })
-    
-    return reports
+@traced()
+def query_tasks(username, filters=None, sort_by=None, ascending=True):
+    """Filtered and sorted tasks for a user, read a page at a time with TaskQuery.page()"""
+    return get_task_service().query(username, filters, sort_by, ascending)
 
-def create_sample_users():
-    users = [
-        {
-            "username": "admin",
-            "password": "admin123",  # In a real app, use hashed passwords!
-            "role": "admin",
-            "organization": "Yildiz Technical University (YTU)",
-            "name": "Administrator",
-            "email": "admin@ytu.edu.tr"
-        }
-    ]
-    
-    for partner in PARTNERS:
-        partner_short = partner.split()[0].lower()
-        users.append({
-            "username": partner_short,
-            "password": f"{partner_short}123",  # In a real app, use hashed passwords!
-            "role": "partner",
-            "organization": partner,
-            "name": f"{partner} Representative",
-            "email": f"contact@{partner_short}.edu"
-        })
-    
-    return users
-
-def create_sample_notifications():
-    today = datetime.now().date()
-    notifications = []
-    
-    # Task assignments
-    for i, partner in enumerate(PARTNERS):
-        notifications.append({
-            "id": f"notif_{len(notifications)+1}",
-            "user": partner,
-            "message": f"New task assigned: Current Task 1",
-            "date": (today - timedelta(days=15)).strftime("%Y-%m-%d"),
-            "read": False,
-            "type": "task_assignment"
-        })
-    
-    # Report reminders
-    for i, partner in enumerate(PARTNERS):
-        notifications.append({
-            "id": f"notif_{len(notifications)+1}",
-            "user": partner,
-            "message": "Reminder: Biweekly report due tomorrow",
-            "date": (today - timedelta(days=1)).strftime("%Y-%m-%d"),
-            "read": False,
-            "type": "report_reminder"
-        })
-    
-    # Comment notifications
-    for i, partner in enumerate(PARTNERS):
-        if i > 0:  # Skip the first partner
-            notifications.append({
-                "id": f"notif_{len(notifications)+1}",
-                "user": partner,
-                "message": f"New comment from {PARTNERS[0]} on Current Task 1",
-                "date": today.strftime("%Y-%m-%d"),
-                "read": False,
-                "type": "comment"
-            })
-    
-    return notifications
+@traced()
+def get_user_reports(username, status=None, partners=None):
+    return get_report_service().reports(username, status, partners)
 
-def create_sample_documents():
-    documents = []
-    
-    # Project documents
-    documents.append({
-        "id": "doc_1",
-        "title": "TechSight Project Handbook",
-        "category": "Project Management",
-        "upload_date": "2024-01-15",
-        "uploaded_by": "Yildiz Technical University (YTU)",
-        "file_type": "PDF",
-        "shared_with": "All Partners",
-        "description": "Project handbook for the TechSight project"
-    })
-    
-    documents.append({
-        "id": "doc_2",
-        "title": "Financial Guidelines",
-        "category": "Project Management",
-        "upload_date": "2024-01-20",
-        "uploaded_by": "Yildiz Technical University (YTU)",
-        "file_type": "PDF",
-        "shared_with": "All Partners",
-        "description": "Financial guidelines for the TechSight project"
-    })
-    
-    # Partner-specific documents
-    for i, partner in enumerate(PARTNERS):
-        documents.append({
-            "id": f"doc_{len(documents)+1}",
-            "title": f"{partner} - Initial Plan",
-            "category": "Planning",
-            "upload_date": "2024-02-01",
-            "uploaded_by": partner,
-            "file_type": "PDF",
-            "shared_with": ["Yildiz Technical University (YTU)", partner],
-            "description": f"Initial plan for {partner}"
-        })
-    
-    return documents
-
-def get_user_tasks(username):
-    user = next((u for u in st.session_state.users if u["username"] == username), None)
-    if not user:
-        return []
-    
-    organization = user["organization"]
-    if user["role"] == "admin":
-        return st.session_state.tasks
-    else:
-        return [task for task in st.session_state.tasks if task["assigned_to"] == organization]
-
-def get_user_reports(username):
-    user = next((u for u in st.session_state.users if u["username"] == username), None)
-    if not user:
-        return []
-    
-    organization = user["organization"]
-    if user["role"] == "admin":
-        return st.session_state.reports
-    else:
-        return [report for report in st.session_state.reports if report["partner"] == organization]
+@traced()
+def get_user_task(username, task_id):
+    return get_task_service().task(username, task_id)
 
-def get_user_notifications(username):
-    user = next((u for u in st.session_state.users if u["username"] == username), None)
-    if not user:
-        return []
-    
-    organization = user["organization"]
-    return [notif for notif in st.session_state.notifications if notif["user"] == organization]
+@traced()
+def get_user_notifications(username, unread_only=False, limit=None):
+    return get_notification_service().notifications(username, unread_only, limit)
 
+@traced()
 def login_user(username, password):
-    user = next((u for u in st.session_state.users if u["username"] == username and u["password"] == password), None)
-    if user:
-        st.session_state.logged_in = True
-        st.session_state.current_user = username
-        st.session_state.is_admin = user["role"] == "admin"
-        return True
-    return False
+    """Check the credentials and start the session; False if they are wrong or the username is locked"""
+    user = get_auth_service().authenticate(username, password)
+    if user is None:
+        return False
+    
+    st.session_state.logged_in = True
+    st.session_state.current_user = username
+    st.session_state.is_admin = user["role"] == "admin"
+    st.session_state.identity = Identity.from_user(user)
+    return True
 
 def logout_user():
     st.session_state.logged_in = False
     st.session_state.current_user = None
     st.session_state.is_admin = False
+    st.session_state.identity = None
 
-def create_gantt_chart(tasks):
-    if not tasks:
-        return None
-    
-    # Prepare data for Gantt chart
-    df = []
-    for task in tasks:
-        task_status = task["status"]
-        color = ""
-        if task_status == "Completed":
-            color = "rgb(0, 128, 0)"  # Green
-        elif task_status == "In Progress":
-            color = "rgb(30, 144, 255)"  # Blue
-        elif task_status == "Not Started":
-            color = "rgb(192, 192, 192)"  # Gray
-        elif task_status == "Delayed":
-            color = "rgb(255, 165, 0)"  # Orange
-        else:  # Cancelled
-            color = "rgb(255, 0, 0)"  # Red
-        
-        df.append(dict(
-            Task=task["title"],
-            Start=task["start_date"],
-            Finish=task["end_date"],
-            Partner=task["assigned_to"],
-            Status=task_status,
-            Description=task["description"],
-            Resource=task["category"],
-            Progress=task["progress"],
-            Priority=task["priority"],
-            color=color
-        ))
-    
-    if not df:
-        return None
-    
-    fig = ff.create_gantt(
-        df,
-        colors={task["title"]: task["color"] for task in df},
-        index_col='Partner',
-        show_colorbar=True,
-        group_tasks=True,
-        showgrid_x=True,
-        showgrid_y=True,
-        title="TechSight Project Gantt Chart"
-    )
-    
-    # Update layout for better visibility
-    fig.update_layout(
-        autosize=True,
-        margin=dict(l=10, r=10, b=10, t=50),
-        title_font=dict(size=24),
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        height=600
-    )
-    
-    return fig
-
-def task_progress_chart(tasks):
-    if not tasks:
-        return None
-    
-    task_status = pd.DataFrame([{"Status": task["status"], "Count": 1} for task in tasks])
-    status_counts = task_status.groupby("Status").sum().reset_index()
-    
-    # Create pie chart
-    fig = px.pie(
-        status_counts,
-        values="Count",
-        names="Status",
-        title="Task Status Distribution",
-        color="Status",
-        color_discrete_map={
-            "Completed": "green",
-            "In Progress": "blue",
-            "Not Started": "gray",
-            "Delayed": "orange",
-            "Cancelled": "red"
-        }
-    )
-    
-    fig.update_layout(
-        margin=dict(t=50, b=20, l=20, r=20),
-        legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5)
-    )
-    
-    return fig
-
-def partner_task_distribution(tasks):
-    if not tasks:
-        return None
-    
-    partner_data = []
-    for partner in PARTNERS:
-        partner_tasks = [task for task in tasks if task["assigned_to"] == partner]
-        if partner_tasks:
-            completed = len([t for t in partner_tasks if t["status"] == "Completed"])
-            in_progress = len([t for t in partner_tasks if t["status"] == "In Progress"])
-            not_started = len([t for t in partner_tasks if t["status"] == "Not Started"])
-            delayed = len([t for t in partner_tasks if t["status"] == "Delayed"])
-            cancelled = len([t for t in partner_tasks if t["status"] == "Cancelled"])
-            
-            partner_data.append({
-                "Partner": partner,
-                "Completed": completed,
-                "In Progress": in_progress,
-                "Not Started": not_started,
-                "Delayed": delayed,
-                "Cancelled": cancelled,
-                "Total": len(partner_tasks)
-            })
-    
-    partner_df = pd.DataFrame(partner_data)
-    
-    # Create stacked bar chart
-    fig = px.bar(
-        partner_df,
-        x="Partner",
-        y=["Completed", "In Progress", "Not Started", "Delayed", "Cancelled"],
-        title="Task Distribution by Partner",
-        color_discrete_map={
-            "Completed": "green",
-            "In Progress": "blue",
-            "Not Started": "gray",
-            "Delayed": "orange",
-            "Cancelled": "red"
-        },
-        labels={"value": "Number of Tasks", "variable": "Status"},
-        text_auto=True
-    )
-    
-    fig.update_layout(
-        xaxis_title="",
-        yaxis_title="Number of Tasks",
-        legend_title="Task Status",
-        font=dict(size=12),
-        xaxis={'categoryorder':'total descending'},
-        margin=dict(t=50, b=150),
-        legend=dict(orientation="h", yanchor="bottom", y=-0.5, xanchor="center", x=0.5)
+# Aggregation
+def get_dashboard_metrics(organization=None):
+    return get_frame_cache().get_or_build(
+        get_database().data_version(),
+        ("metrics", organization),
+        lambda: compute_dashboard_metrics(get_task_service(), get_report_service(), organization)
     )
-    
-    fig.update_xaxes(tickangle=45)
-    
-    return fig
 
-def report_submission_chart(reports):
-    if not reports:
-        return None
-    
-    report_data = []
-    for partner in PARTNERS:
-        partner_reports = [r for r in reports if r["partner"] == partner]
-        if partner_reports:
-            submitted = len([r for r in partner_reports if r["status"] == "Submitted"])
-            pending = len([r for r in partner_reports if r["status"] == "Pending"])
-            draft = len([r for r in partner_reports if r["status"] == "Draft"])
-            
-            report_data.append({
-                "Partner": partner,
-                "Submitted": submitted,
-                "Pending": pending,
-                "Draft": draft,
-                "Total": len(partner_reports),
-                "Submission Rate": (submitted / len(partner_reports)) * 100 if len(partner_reports) > 0 else 0
-            })
-    
-    report_df = pd.DataFrame(report_data)
-    
-    # Create bar chart
-    fig = px.bar(
-        report_df,
-        x="Partner",
-        y=["Submitted", "Pending", "Draft"],
-        title="Report Submission Status by Partner",
-        color_discrete_map={
-            "Submitted": "green",
-            "Pending": "orange",
-            "Draft": "gray"
-        },
-        labels={"value": "Number of Reports", "variable": "Status"},
-        text_auto=True
-    )
-    
-    fig.update_layout(
-        xaxis_title="",
-        yaxis_title="Number of Reports",
-        legend_title="Report Status",
-        font=dict(size=12),
-        margin=dict(t=50, b=150),
-        legend=dict(orientation="h", yanchor="bottom", y=-0.5, xanchor="center", x=0.5)
+def cached_figure(chart, builder, **filters):
+    """Return the cached figure for this chart, data version, viewer and filter set"""
+    user_info = get_current_user_info()
+    key = (
+        chart,
+        user_info.role,
+        user_info.organization,
+        tuple(sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in filters.items()))
     )
     
-    fig.update_xaxes(tickangle=45)
-    
-    return fig
+    def build():
+        with TRACER.span(f"figure:{chart}"):
+            return builder()
+    return get_figure_cache().get_or_build(get_database().data_version(), key, build)
 
 def add_task(task_data):
-    task_id = f"task_{len(st.session_state.tasks)+1}"
-    new_task = {
-        "id": task_id,
-        **task_data,
-        "comments": []
-    }
-    st.session_state.tasks.append(new_task)
-    
-    # Add notification
-    new_notification = {
-        "id": f"notif_{len(st.session_state.notifications)+1}",
-        "user": task_data["assigned_to"],
-        "message": f"New task assigned: {task_data['title']}",
-        "date": datetime.now().strftime("%Y-%m-%d"),
-        "read": False,
-        "type": "task_assignment"
-    }
-    st.session_state.notifications.append(new_notification)
-    
-    return task_id
+    return add_tasks([task_data])[0]
 
-def edit_task(task_id, updated_data):
-    for i, task in enumerate(st.session_state.tasks):
-        if task["id"] == task_id:
-            for key, value in updated_data.items():
-                st.session_state.tasks[i][key] = value
-            
-            # Add notification if assigned to has changed
-            if "assigned_to" in updated_data:
-                new_notification = {
-                    "id": f"notif_{len(st.session_state.notifications)+1}",
-                    "user": updated_data["assigned_to"],
-                    "message": f"Task reassigned to you: {st.session_state.tasks[i]['title']}",
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "read": False,
-                    "type": "task_assignment"
-                }
-                st.session_state.notifications.append(new_notification)
-            
-            return True
-    return False
+@traced()
+def add_tasks(tasks):
+    return get_task_service().add_many(tasks, actor=st.session_state.current_user)
+
+@traced()
+def edit_task(task_id, updated_data, base=None):
+    return get_task_service().edit(task_id, updated_data, base=base, actor=st.session_state.current_user)
 
+@traced()
 def delete_task(task_id):
-    for i, task in enumerate(st.session_state.tasks):
-        if task["id"] == task_id:
-            st.session_state.tasks.pop(i)
-            return True
-    return False
+    return get_task_service().delete(task_id, actor=st.session_state.current_user)
+
+@traced()
+def get_task_history(task_id):
+    return get_task_service().history(task_id)
 
+@traced()
+def add_task_comment(task_id, text, parent_id=None):
+    return get_task_service().comment(task_id, get_current_user_info().organization, text, parent_id)
+
+@traced()
 def add_report(report_data):
-    report_id = f"report_{len(st.session_state.reports)+1}"
-    new_report = {
-        "id": report_id,
-        **report_data
-    }
-    st.session_state.reports.append(new_report)
-    
-    # Add notification for admin
-    new_notification = {
-        "id": f"notif_{len(st.session_state.notifications)+1}",
-        "user": "Yildiz Technical University (YTU)",
-        "message": f"New report submitted by {report_data['partner']}",
-        "date": datetime.now().strftime("%Y-%m-%d"),
-        "read": False,
-        "type": "report_submission"
-    }
-    st.session_state.notifications.append(new_notification)
-    
-    return report_id
+    return get_report_service().add(report_data, actor=st.session_state.current_user)
 
-def edit_report(report_id, updated_data):
-    for i, report in enumerate(st.session_state.reports):
-        if report["id"] == report_id:
-            for key, value in updated_data.items():
-                st.session_state.reports[i][key] = value
-            
-            # Add notification if status changed to Submitted
-            if "status" in updated_data and updated_data["status"] == "Submitted":
-                new_notification = {
-                    "id": f"notif_{len(st.session_state.notifications)+1}",
-                    "user": "Yildiz Technical University (YTU)",
-                    "message": f"Report {st.session_state.reports[i]['title']} submitted by {st.session_state.reports[i]['partner']}",
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "read": False,
-                    "type": "report_submission"
-                }
-                st.session_state.notifications.append(new_notification)
-            
-            return True
-    return False
+@traced()
+def edit_report(report_id, updated_data, base=None):
+    return get_report_service().edit(report_id, updated_data, base=base, actor=st.session_state.current_user)
 
+@traced()
 def delete_report(report_id):
-    for i, report in enumerate(st.session_state.reports):
-        if report["id"] == report_id:
-            st.session_state.reports.pop(i)
-            return True
-    return False
+    return get_report_service().delete(report_id, actor=st.session_state.current_user)
+
+@traced()
+def import_tasks(rows, assigned_by, source):
+    return get_task_service().import_rows(rows, assigned_by, source, actor=st.session_state.current_user)
 
-def get_download_link(data, filename, text):
-    """Generate a link to download data as a file"""
-    json_str = json.dumps(data, indent=4)
-    b64 = base64.b64encode(json_str.encode()).decode()
-    href = f'<a href="data:application/json;base64,{b64}" download="{filename}">{text}</a>'
-    return href
+def iter_export(username, kind, fmt):
+    return get_task_service().export(username, kind, fmt)
 
+@lru_cache(maxsize=DATE_FORMAT_CACHE_SIZE)
 def format_date(date_str):
     """Format date string to a more readable format"""
     try:
@@ -687,16 +271,198 @@ def format_date(date_str):
     except:
         return date_str
 
+def paginate(total, key, noun):
+    """Render page size / page controls and return the (start, end) slice of the current page"""
+    page_size_key = f"{key}_page_size"
+    page_key = f"{key}_page"
+    page_size = st.session_state.get(page_size_key, PAGE_SIZES[0])
+    page_count = max(1, math.ceil(total / page_size))
+    
+    # Filters may have shrunk the list since the page was chosen
+    if st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = page_count
+    
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        st.selectbox(f"{noun.capitalize()} per page", PAGE_SIZES, key=page_size_key)
+    with col2:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, key=page_key)
+    
+    start = (page - 1) * page_size
+    end = min(start + page_size, total)
+    with col3:
+        if total:
+            st.markdown(f"Showing {start + 1}-{end} of {total} {noun}")
+        else:
+            st.markdown(f"Showing 0 {noun}")
+    
+    return start, end
+
+def comment_card(comment, reply=False):
+    st.markdown(f"""
+    <div style="padding: 10px; margin-bottom: 10px; margin-left: {'30px' if reply else '0'}; border-radius: 5px; background-color: #f9f9f9;">
+        <strong>{comment['user']}</strong> - {comment['date']}<br>
+        {comment['text']}
+    </div>
+    """, unsafe_allow_html=True)
+
+def snapshot_task(task):
+    """Copy of a task record for an edit form, with its dates kept as parsed dates"""
+    return {**task, "start_day": task.start_day, "end_day": task.end_day}
+
+def edit_base(key, record):
+    """The record as it was when the form was opened, so the save can merge with other edits"""
+    base = st.session_state.get(key)
+    if base is None or base["id"] != record["id"]:
+        base = st.session_state[key] = snapshot_task(record)
+    return base
+
+def save_task_edit(task_id, updated_data, base_key):
+    """Save a form against its base; conflicting fields are reported on the form instead of overwritten"""
+    try:
+        saved = edit_task(task_id, updated_data, base=st.session_state[base_key])
+    except EditConflict as conflict:
+        st.error("Someone else changed this task while you were editing it. "
+                 "Reload the latest version and apply your changes again.")
+        st.table(pd.DataFrame(
+            [(field, conflict.current[field], updated_data[field]) for field in conflict.fields],
+            columns=["Field", "Saved value", "Your value"]
+        ).astype(str))
+        return False
+    if saved:
+        del st.session_state[base_key]
+    return saved
+
+def display_task_comments(task):
+    """Latest comment threads of a task, older ones on request, and the comment form"""
+    shown_key = f"comments_shown_{task['id']}"
+    shown = st.session_state.get(shown_key, COMMENT_PAGE_SIZE)
+    total, threads = get_dataset().view(st.session_state.current_user).comment_threads(task["id"], shown)
+    
+    for thread in threads:
+        comment_card(thread)
+        for reply in thread["replies"]:
+            comment_card(reply, reply=True)
+    
+    if total > len(threads):
+        st.caption(f"Showing the latest {len(threads)} of {total} threads")
+        if st.button("Show older comments", key=f"older_comments_{task['id']}"):
+            st.session_state[shown_key] = shown + COMMENT_PAGE_SIZE
+            st.rerun()
+    
+    # Add comment
+    parent_id = None
+    if threads:
+        by_id = {thread["id"]: thread for thread in threads}
+        parent_id = st.selectbox(
+            "Reply to",
+            [None] + list(by_id),
+            format_func=lambda c: "New thread" if c is None else f"{by_id[c]['user']}: {by_id[c]['text'][:40]}",
+            key=f"reply_to_{task['id']}"
+        )
+    new_comment = st.text_area("Add a comment", key=f"comment_{task['id']}")
+    if st.button("Post Comment", key=f"post_{task['id']}"):
+        if add_task_comment(task["id"], new_comment, parent_id=parent_id):
+            st.success("Comment added!")
+            # st.experimental_rerun()
+
+def display_task_history(task):
+    """What changed in a task, when and by whom, read from the change log"""
+    history = get_task_history(task["id"])
+    if not history:
+        st.caption("No recorded changes.")
+        return
+    
+    rows = []
+    for change in history:
+        if change["op"] == "update":
+            details = "; ".join(f"{field}: {old} → {new}" for field, old, new in change["fields"])
+        else:
+            details = {"insert": "Created", "delete": "Deleted"}[change["op"]]
+        rows.append({"When": change["at"], "Who": change["actor"] or "", "Change": details})
+    st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
+def display_comment_search():
+    text = st.text_input("Find comments containing", key="comment_search")
+    if not text:
+        return
+    
+    view = get_dataset().view(st.session_state.current_user)
+    start, end = paginate(view.count_comment_matches(text), "comment_search", "comments")
+    for comment in view.search_comments(text, limit=end - start, offset=start):
+        st.markdown(f"**{comment['task_title']}**")
+        comment_card(comment)
+
+def marked_html(text):
+    """Escape search output and turn its match markers into <mark> tags"""
+    start, end = SEARCH_MARKS
+    return html.escape(text or "").replace(start, "<mark>").replace(end, "</mark>")
+
+def data_transfer_panel():
+    """Download the data the user can see; admins can also bulk-import tasks"""
+    formats = export_formats()
+    col1, col2 = st.columns(2)
+    with col1:
+        kind = st.selectbox("Data", ["Tasks", "Reports", "Comments"], key="export_kind").lower()
+    with col2:
+        fmt = formats[st.selectbox("Format", list(formats), key="export_format")]
+    
+    # Encoding only happens on request. This Streamlit version needs the whole
+    # payload for download_button, so the streamed chunks are joined once for
+    # the rerun that renders the button; nothing is kept in the session, and
+    # the payload is released by the next rerun.
+    if st.button("Prepare export"):
+        st.download_button(
+            f"Download {kind}.{fmt}",
+            data=b"".join(iter_export(st.session_state.current_user, kind, fmt)),
+            file_name=f"{kind}.{fmt}",
+            mime=EXPORT_MIME_TYPES[fmt]
+        )
+    
+    if not st.session_state.is_admin:
+        return
+    
+    st.markdown("#### Import Tasks")
+    st.caption("Columns: " + ", ".join(TASK_FIELDS[1:]) + ". Ids in the file are ignored.")
+    uploaded = st.file_uploader("Task file", type=list(EXPORT_MIME_TYPES), key="task_import_file")
+    if uploaded is not None and st.button("Import tasks"):
+        try:
+            imported, errors = import_tasks(
+                parse_import(uploaded, uploaded.name.rsplit(".", 1)[-1].lower()),
+                get_current_user_info().organization,
+                uploaded.name
+            )
+        except (ValueError, csv.Error) as e:
+            st.error(f"Could not read {uploaded.name}: {e}")
+            return
+        
+        if errors:
+            st.error(f"Nothing was imported: {len(errors)} problems found.")
+            for number, problem in errors[:20]:
+                st.markdown(f"- Row {number}: {problem}")
+        elif imported:
+            st.success(f"Imported {imported} tasks.")
+        else:
+            st.warning("The file contains no tasks.")
+
 def get_current_user_info():
-    if not st.session_state.logged_in or not st.session_state.current_user:
+    if not st.session_state.logged_in:
         return None
-    
-    return next((u for u in st.session_state.users if u["username"] == st.session_state.current_user), None)
+    return st.session_state.identity
 
 # Main App
 def run_app():
     init_session_state()
     
+    profile = None
+    try:
+        with TRACER.rerun() as profile:
+            render_app()
+    finally:
+        if profile is not None:
+            st.session_state.rerun_profile = profile
+
+def render_app():
     # Login screen
     if not st.session_state.logged_in:
         display_login()
@@ -704,36 +470,46 @@ def run_app():
     
     # Main application after login
     user_info = get_current_user_info()
-    organization = user_info["organization"]
+    organization = user_info.organization
     
     # Sidebar
     with st.sidebar:
         st.image("https://via.placeholder.com/150x100?text=TechSight", width=150)
         st.title("TechSight Project")
         
-        st.markdown(f"**User:** {user_info['name']}")
+        st.markdown(f"**User:** {user_info.name}")
         st.markdown(f"**Organization:** {organization}")
-        st.markdown(f"**Role:** {user_info['role'].capitalize()}")
+        st.markdown(f"**Role:** {user_info.role.capitalize()}")
         
-        menu_options = ["Dashboard", "Tasks", "Gantt Chart", "Reports", "Documents"]
+        menu_options = ["Dashboard", "Tasks", "Gantt Chart", "Reports", "Search", "Documents"]
         if st.session_state.is_admin:
             menu_options.append("Partner Management")
             menu_options.append("Settings")
         
         selected_menu = st.selectbox("Navigation", menu_options)
         
-        notifications = get_user_notifications(st.session_state.current_user)
-        unread_count = len([n for n in notifications if not n["read"]])
+        unread_count = get_notification_service().unread_count(organization)
         
         if unread_count > 0:
             st.markdown(f"#### 📬 Notifications ({unread_count})")
             
+            notifications = get_user_notifications(
+                st.session_state.current_user,
+                unread_only=True,
+                limit=NOTIFICATION_SIDEBAR_LIMIT
+            )
             for notif in notifications:
-                if not notif["read"]:
-                    with st.container():
-                        st.markdown(f"**{notif['message']}**")
-                        st.caption(f"{notif['date']}")
-                        st.markdown("---")
+                with st.container():
+                    st.markdown(f"**{notif['message']}**")
+                    st.caption(f"{notif['date']}")
+                    st.markdown("---")
+            
+            if unread_count > len(notifications):
+                st.caption(f"{unread_count - len(notifications)} older unread notifications")
+            
+            if st.button("Mark all as read"):
+                get_notification_service().mark_read(organization)
+                st.rerun()
         
         if st.button("Logout"):
             logout_user()
@@ -748,13 +524,16 @@ def run_app():
         display_gantt_chart(organization)
     elif selected_menu == "Reports":
         display_reports(organization)
+    elif selected_menu == "Search":
+        display_search(organization)
     # elif selected_menu == "Documents":
     #     # display_documents(organization)
     # elif selected_menu == "Partner Management" and st.session_state.is_admin:
     #     # display_partner_management()
-    # elif selected_menu == "Settings" and st.session_state.is_admin:
-    #     # display_settings()
+    elif selected_menu == "Settings" and st.session_state.is_admin:
+        display_settings()
 
+@traced()
 def display_login():
     st.title("TechSight Project Management Tool")
     
@@ -794,6 +573,9 @@ def display_login():
             if login_user(username, password):
                 st.success("Login successful!")
                 st.experimental_rerun()
+            elif get_auth_service().retry_after(username):
+                st.error(f"Too many failed attempts. Try again in "
+                         f"{math.ceil(get_auth_service().retry_after(username))} seconds.")
             else:
                 st.error("Invalid username or password")
         
@@ -825,11 +607,12 @@ def display_login():
         st.markdown("This tool is provided as-is without any warranty or guarantee.")
         st.markdown("---")
 
+@traced()
 def display_dashboard(organization):
     st.title("TechSight Project Dashboard")
     
-    tasks = get_user_tasks(st.session_state.current_user)
-    reports = get_user_reports(st.session_state.current_user)
+    view = get_dataset().view(st.session_state.current_user)
+    metrics = get_dashboard_metrics(None if st.session_state.is_admin else organization)
     
     # Project Overview
     st.markdown("## Project Overview")
@@ -839,33 +622,26 @@ def display_dashboard(organization):
     # Task metrics
     with col1:
         st.markdown('<div class="metrics-card">', unsafe_allow_html=True)
-        total_tasks = len(tasks)
         st.markdown("<h3>Total Tasks</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p>{total_tasks}</p>", unsafe_allow_html=True)
+        st.markdown(f"<p>{metrics['total_tasks']}</p>", unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
         st.markdown('<div class="metrics-card">', unsafe_allow_html=True)
-        completed_tasks = len([t for t in tasks if t["status"] == "Completed"])
-        completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
         st.markdown("<h3>Task Completion Rate</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p>{completion_rate:.1f}%</p>", unsafe_allow_html=True)
+        st.markdown(f"<p>{metrics['completion_rate']:.1f}%</p>", unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col3:
         st.markdown('<div class="metrics-card">', unsafe_allow_html=True)
-        in_progress = len([t for t in tasks if t["status"] == "In Progress"])
         st.markdown("<h3>Tasks In Progress</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p>{in_progress}</p>", unsafe_allow_html=True)
+        st.markdown(f"<p>{metrics['in_progress']}</p>", unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col4:
         st.markdown('<div class="metrics-card">', unsafe_allow_html=True)
-        total_reports = len(reports)
-        submitted_reports = len([r for r in reports if r["status"] == "Submitted"])
-        report_rate = (submitted_reports / total_reports * 100) if total_reports > 0 else 0
         st.markdown("<h3>Report Submission Rate</h3>", unsafe_allow_html=True)
-        st.markdown(f"<p>{report_rate:.1f}%</p>", unsafe_allow_html=True)
+        st.markdown(f"<p>{metrics['report_rate']:.1f}%</p>", unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Charts
@@ -874,35 +650,24 @@ def display_dashboard(organization):
     col1, col2 = st.columns(2)
     
     with col1:
-        fig = task_progress_chart(tasks)
+        fig = cached_figure("task_progress", lambda: task_progress_chart(metrics["task_status_counts"]))
         if fig:
             st.plotly_chart(fig, use_container_width=True)
     
     with col2:
         if st.session_state.is_admin:
-            fig = partner_task_distribution(tasks)
-            if fig:
-                st.plotly_chart(fig, use_container_width=True)
+            fig = cached_figure(
+                "partner_task_distribution",
+                lambda: partner_task_distribution(metrics["task_status_counts"])
+            )
         else:
             # For partners, show their task categories distribution
-            task_categories = {}
-            for task in tasks:
-                category = task["category"]
-                if category not in task_categories:
-                    task_categories[category] = 0
-                task_categories[category] += 1
-            
-            df = pd.DataFrame({"Category": list(task_categories.keys()), "Count": list(task_categories.values())})
-            if not df.empty:
-                fig = px.bar(
-                    df,
-                    x="Category",
-                    y="Count",
-                    title=f"Tasks by Category for {organization}",
-                    color="Category"
-                )
-                fig.update_layout(xaxis_title="", yaxis_title="Number of Tasks")
-                st.plotly_chart(fig, use_container_width=True)
+            fig = cached_figure(
+                "task_categories",
+                lambda: task_category_chart(metrics["category_counts"], organization)
+            )
+        if fig:
+            st.plotly_chart(fig, use_container_width=True)
     
     # Recent Activities
     st.markdown("## Recent Activities")
@@ -911,7 +676,7 @@ def display_dashboard(organization):
     
     with col1:
         st.markdown("### Recent Tasks")
-        recent_tasks = sorted(tasks, key=lambda x: x["start_date"], reverse=True)[:5]
+        recent_tasks = view.recent_tasks(DASHBOARD_RECENT_ITEMS)
         
         if recent_tasks:
             for task in recent_tasks:
@@ -928,7 +693,7 @@ def display_dashboard(organization):
     
     with col2:
         st.markdown("### Recent Reports")
-        recent_reports = sorted(reports, key=lambda x: x["submission_date"], reverse=True)[:5]
+        recent_reports = view.recent_reports(DASHBOARD_RECENT_ITEMS)
         
         if recent_reports:
             for report in recent_reports:
@@ -946,15 +711,11 @@ def display_dashboard(organization):
     # Upcoming Deadlines
     st.markdown("## Upcoming Deadlines")
     today = datetime.now().date()
-    upcoming_tasks = sorted(
-        [t for t in tasks if t["status"] not in ["Completed", "Cancelled"] and datetime.strptime(t["end_date"], "%Y-%m-%d").date() >= today],
-        key=lambda x: x["end_date"]
-    )[:5]
+    upcoming_tasks = view.upcoming_deadlines(today, DASHBOARD_RECENT_ITEMS)
     
     if upcoming_tasks:
         for task in upcoming_tasks:
-            due_date = datetime.strptime(task["end_date"], "%Y-%m-%d").date()
-            days_left = (due_date - today).days
+            days_left = (task.end_day - today).days
             
             st.markdown(f"""
             <div style="padding: 10px; margin-bottom: 10px; border-radius: 5px; background-color: {'#ffe6e6' if days_left <= 3 else '#fff3e6' if days_left <= 7 else '#f9f9f9'};">
@@ -967,12 +728,10 @@ def display_dashboard(organization):
     else:
         st.info("No upcoming deadlines.")
 
+@traced()
 def display_tasks(organization):
     st.title("Task Management")
     
-    # Get tasks relevant to the current user
-    tasks = get_user_tasks(st.session_state.current_user)
-    
     # Task filtering options
     st.markdown("### Filter Tasks")
     col1, col2, col3 = st.columns(3)
@@ -989,37 +748,27 @@ def display_tasks(organization):
         else:
             filter_partner = [organization]
     
-    # Apply filters
-    filtered_tasks = [
-        task for task in tasks 
-        if task["status"] in filter_status 
-        and task["category"] in filter_category
-        and task["assigned_to"] in filter_partner
-    ]
-    
     # Sort options
     sort_col1, sort_col2 = st.columns(2)
     with sort_col1:
         sort_by = st.selectbox(
             "Sort by",
-            ["Start Date", "End Date", "Status", "Progress", "Priority"]
+            list(TASK_SORT_OPTIONS)
         )
     
     with sort_col2:
         sort_ascending = st.checkbox("Ascending order", value=True)
     
-    # Apply sorting
-    if sort_by == "Start Date":
-        filtered_tasks = sorted(filtered_tasks, key=lambda x: x["start_date"], reverse=not sort_ascending)
-    elif sort_by == "End Date":
-        filtered_tasks = sorted(filtered_tasks, key=lambda x: x["end_date"], reverse=not sort_ascending)
-    elif sort_by == "Status":
-        filtered_tasks = sorted(filtered_tasks, key=lambda x: x["status"], reverse=not sort_ascending)
-    elif sort_by == "Progress":
-        filtered_tasks = sorted(filtered_tasks, key=lambda x: x["progress"], reverse=not sort_ascending)
-    elif sort_by == "Priority":
-        priority_map = {"High": 3, "Medium": 2, "Low": 1}
-        filtered_tasks = sorted(filtered_tasks, key=lambda x: priority_map.get(x["priority"], 0), reverse=not sort_ascending)
+    # Get the tasks relevant to the current user that match the filters, in sort order
+    filtered_tasks = query_tasks(
+        st.session_state.current_user,
+        filters={"status": filter_status, "category": filter_category, "partners": filter_partner},
+        sort_by=TASK_SORT_OPTIONS[sort_by],
+        ascending=sort_ascending
+    )
+    
+    with st.expander("Search Comments"):
+        display_comment_search()
     
     # Create new task
     st.markdown("### Task Management")
@@ -1060,7 +809,7 @@ def display_tasks(organization):
                         "title": task_title,
                         "description": task_description,
                         "assigned_to": task_assigned_to,
-                        "assigned_by": get_current_user_info()["organization"],
+                        "assigned_by": get_current_user_info().organization,
                         "category": task_category,
                         "start_date": task_start_date.strftime("%Y-%m-%d"),
                         "end_date": task_end_date.strftime("%Y-%m-%d"),
@@ -1078,12 +827,16 @@ def display_tasks(organization):
             st.session_state.show_task_form = False
             # st.experimental_rerun()
     
+    with st.expander("Export / Import"):
+        data_transfer_panel()
+    
     # Task list
     st.markdown("### Task List")
-    st.markdown(f"Showing {len(filtered_tasks)} tasks")
+    start, end = paginate(filtered_tasks.count(), "tasks", "tasks")
+    page_tasks = filtered_tasks.page(start, end - start)
     
-    if filtered_tasks:
-        for task in filtered_tasks:
+    if page_tasks:
+        for task in page_tasks:
             with st.expander(f"{task['title']} ({task['status']})"):
                 col1, col2 = st.columns([2, 1])
                 
@@ -1107,11 +860,13 @@ def display_tasks(organization):
                 with col1:
                     if st.button(f"Update Progress", key=f"update_{task['id']}"):
                         st.session_state.update_task_id = task["id"]
+                        st.session_state.update_task_base = snapshot_task(task)
                         st.session_state.update_task_progress = True
                 
                 with col2:
                     if st.session_state.is_admin and st.button(f"Edit Task", key=f"edit_{task['id']}"):
                         st.session_state.edit_task_id = task["id"]
+                        st.session_state.edit_task_base = snapshot_task(task)
                         st.session_state.show_edit_form = True
                 
                 with col3:
@@ -1122,58 +877,25 @@ def display_tasks(organization):
                 
                 # Comments section
                 st.markdown("#### Comments")
+                display_task_comments(task)
                 
-                for comment in task.get("comments", []):
-                    st.markdown(f"""
-                    <div style="padding: 10px; margin-bottom: 10px; border-radius: 5px; background-color: #f9f9f9;">
-                        <strong>{comment['user']}</strong> - {comment['date']}<br>
-                        {comment['text']}
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # Add comment
-                new_comment = st.text_area("Add a comment", key=f"comment_{task['id']}")
-                if st.button("Post Comment", key=f"post_{task['id']}"):
-                    for i, t in enumerate(st.session_state.tasks):
-                        if t["id"] == task["id"]:
-                            if "comments" not in st.session_state.tasks[i]:
-                                st.session_state.tasks[i]["comments"] = []
-                            
-                            st.session_state.tasks[i]["comments"].append({
-                                "user": get_current_user_info()["organization"],
-                                "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                                "text": new_comment
-                            })
-                            
-                            # Notify task owner if not the commenter
-                            if task["assigned_to"] != get_current_user_info()["organization"]:
-                                new_notification = {
-                                    "id": f"notif_{len(st.session_state.notifications)+1}",
-                                    "user": task["assigned_to"],
-                                    "message": f"New comment on task: {task['title']}",
-                                    "date": datetime.now().strftime("%Y-%m-%d"),
-                                    "read": False,
-                                    "type": "comment"
-                                }
-                                st.session_state.notifications.append(new_notification)
-                            
-                            st.success("Comment added!")
-                            # st.experimental_rerun()
-                            break
+                if st.checkbox("Show change history", key=f"history_{task['id']}"):
+                    display_task_history(task)
     else:
         st.info("No tasks found with the selected filters.")
     
     # Task progress update form
     if hasattr(st.session_state, "update_task_progress") and st.session_state.update_task_progress:
         task_id = st.session_state.update_task_id
-        task = next((t for t in tasks if t["id"] == task_id), None)
+        task = get_user_task(st.session_state.current_user, task_id)
         
         if task:
             st.markdown("### Update Task Progress")
+            base = edit_base("update_task_base", task)
             
             with st.form(key="progress_form"):
-                new_progress = st.slider("Progress (%)", 0, 100, int(task["progress"]))
-                new_status = st.selectbox("Status", TASK_STATUS, TASK_STATUS.index(task["status"]))
+                new_progress = st.slider("Progress (%)", 0, 100, int(base["progress"]))
+                new_status = st.selectbox("Status", TASK_STATUS, TASK_STATUS.index(base["status"]))
                 
                 status_note = st.text_area("Status Note (Optional)")
                 
@@ -1185,53 +907,49 @@ def display_tasks(organization):
                         "status": new_status
                     }
                     
-                    if edit_task(task_id, updated_data):
+                    if save_task_edit(task_id, updated_data, "update_task_base"):
                         # Add comment if there's a status note
                         if status_note:
-                            for i, t in enumerate(st.session_state.tasks):
-                                if t["id"] == task_id:
-                                    if "comments" not in st.session_state.tasks[i]:
-                                        st.session_state.tasks[i]["comments"] = []
-                                    
-                                    st.session_state.tasks[i]["comments"].append({
-                                        "user": get_current_user_info()["organization"],
-                                        "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                                        "text": f"Status update: {status_note}"
-                                    })
-                                    break
+                            add_task_comment(task_id, f"Status update: {status_note}")
                         
                         st.success("Task updated successfully!")
                         st.session_state.update_task_progress = False
                         # st.experimental_rerun()
             
+            if base["version"] != task["version"] and st.button("Reload Latest", key="reload_update"):
+                st.session_state.update_task_base = snapshot_task(task)
+                st.rerun()
+            
             if st.button("Cancel Update"):
                 st.session_state.update_task_progress = False
+                st.session_state.pop("update_task_base", None)
                 # st.experimental_rerun()
     
     # Task edit form
     if st.session_state.is_admin and hasattr(st.session_state, "show_edit_form") and st.session_state.show_edit_form:
         task_id = st.session_state.edit_task_id
-        task = next((t for t in tasks if t["id"] == task_id), None)
+        task = get_user_task(st.session_state.current_user, task_id)
         
         if task:
             st.markdown("### Edit Task")
+            base = edit_base("edit_task_base", task)
             
             with st.form(key="edit_task_form"):
-                task_title = st.text_input("Task Title", value=task["title"])
-                task_description = st.text_area("Task Description", value=task["description"])
+                task_title = st.text_input("Task Title", value=base["title"])
+                task_description = st.text_area("Task Description", value=base["description"])
                 
                 col1, col2 = st.columns(2)
                 with col1:
-                    task_assigned_to = st.selectbox("Assigned To", PARTNERS, PARTNERS.index(task["assigned_to"]))
-                    task_category = st.selectbox("Category", TASK_CATEGORIES, TASK_CATEGORIES.index(task["category"]))
-                    task_priority = st.selectbox("Priority", ["High", "Medium", "Low"], ["High", "Medium", "Low"].index(task["priority"]))
+                    task_assigned_to = st.selectbox("Assigned To", PARTNERS, PARTNERS.index(base["assigned_to"]))
+                    task_category = st.selectbox("Category", TASK_CATEGORIES, TASK_CATEGORIES.index(base["category"]))
+                    task_priority = st.selectbox("Priority", ["High", "Medium", "Low"], ["High", "Medium", "Low"].index(base["priority"]))
                 
                 with col2:
-                    task_start_date = st.date_input("Start Date", datetime.strptime(task["start_date"], "%Y-%m-%d"))
-                    task_end_date = st.date_input("End Date", datetime.strptime(task["end_date"], "%Y-%m-%d"))
-                    task_status = st.selectbox("Status", TASK_STATUS, TASK_STATUS.index(task["status"]))
+                    task_start_date = st.date_input("Start Date", base["start_day"])
+                    task_end_date = st.date_input("End Date", base["end_day"])
+                    task_status = st.selectbox("Status", TASK_STATUS, TASK_STATUS.index(base["status"]))
                 
-                task_progress = st.slider("Progress (%)", 0, 100, task["progress"])
+                task_progress = st.slider("Progress (%)", 0, 100, base["progress"])
                 
                 submit_button = st.form_submit_button("Update Task")
                 
@@ -1253,21 +971,24 @@ def display_tasks(organization):
                             "priority": task_priority
                         }
                         
-                        if edit_task(task_id, updated_data):
+                        if save_task_edit(task_id, updated_data, "edit_task_base"):
                             st.success("Task updated successfully!")
                             st.session_state.show_edit_form = False
                             # st.experimental_rerun()
             
+            if base["version"] != task["version"] and st.button("Reload Latest", key="reload_edit"):
+                st.session_state.edit_task_base = snapshot_task(task)
+                st.rerun()
+            
             if st.button("Cancel Edit"):
                 st.session_state.show_edit_form = False
+                st.session_state.pop("edit_task_base", None)
                 # st.experimental_rerun()
 
+@traced()
 def display_gantt_chart(organization):
     st.title("Project Gantt Chart")
     
-    # Get tasks relevant to the current user
-    tasks = get_user_tasks(st.session_state.current_user)
-    
     # Filtering options for Gantt chart
     st.markdown("### Filter Gantt Chart")
     col1, col2, col3 = st.columns(3)
@@ -1284,18 +1005,60 @@ def display_gantt_chart(organization):
         else:
             filter_partner = [organization]
     
-    # Apply filters
-    filtered_tasks = [
-        task for task in tasks 
-        if task["status"] in filter_status 
-        and task["category"] in filter_category
-        and task["assigned_to"] in filter_partner
-    ]
+    # Get the tasks relevant to the current user that match the filters
+    filtered_tasks = get_user_tasks(
+        st.session_state.current_user,
+        status=filter_status,
+        category=filter_category,
+        partners=filter_partner
+    )
+    
+    # Visible window and level of detail
+    if len(filtered_tasks):
+        first_day, last_day = filtered_tasks.extent()
+    else:
+        first_day = last_day = datetime.now().date()
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        window = st.date_input("Date window", value=(first_day, last_day))
+        window_start, window_end = (window[0], window[-1]) if window else (first_day, last_day)
+    
+    with col2:
+        gantt_level = st.selectbox("Level of detail", list(GANTT_LEVELS))
+    
+    visible_tasks = filtered_tasks.overlapping(window_start, window_end)
+    if gantt_level == "Auto" and len(visible_tasks) > GANTT_MAX_TASKS:
+        gantt_level = "Roll up by partner"
+    
+    # Only a bounded number of individual tasks is ever sent to the browser
+    shown_tasks = visible_tasks.sorted_by("start_date")[:GANTT_MAX_TASKS]
     
     # Create Gantt chart
-    gantt_fig = create_gantt_chart(filtered_tasks)
+    if GANTT_LEVELS[gantt_level] is None:
+        gantt_builder = lambda: create_gantt_chart(shown_tasks, (window_start, window_end))
+    else:
+        gantt_builder = lambda: create_rollup_gantt_chart(
+            visible_tasks.frame(), GANTT_LEVELS[gantt_level], (window_start, window_end)
+        )
+    
+    gantt_fig = cached_figure(
+        "gantt",
+        gantt_builder,
+        status=filter_status,
+        category=filter_category,
+        partners=filter_partner,
+        window=(window_start, window_end),
+        level=gantt_level
+    )
     
     if gantt_fig:
+        if GANTT_LEVELS[gantt_level] is None and len(visible_tasks) > len(shown_tasks):
+            st.caption(
+                f"Showing the first {len(shown_tasks)} of {len(visible_tasks)} tasks in this window. "
+                "Narrow the window or roll tasks up to see the rest."
+            )
         st.plotly_chart(gantt_fig, use_container_width=True)
     else:
         st.info("No tasks found to display in Gantt chart.")
@@ -1305,80 +1068,36 @@ def display_gantt_chart(organization):
     
     col1, col2 = st.columns(2)
     
+    # Counted from the snapshot's integer codes, only when the figure isn't cached
+    filters = {"status": filter_status, "category": filter_category, "partners": filter_partner}
+    
     with col1:
         # Task category distribution
-        categories = {}
-        for task in filtered_tasks:
-            category = task["category"]
-            if category not in categories:
-                categories[category] = 0
-            categories[category] += 1
-        
-        if categories:
-            df = pd.DataFrame({"Category": list(categories.keys()), "Count": list(categories.values())})
-            fig = px.pie(
-                df,
-                values="Count",
-                names="Category",
-                title="Tasks by Category",
-                hole=0.4
-            )
+        fig = cached_figure("gantt_categories", lambda: category_share_chart(filtered_tasks.counts("category")), **filters)
+        if fig:
             st.plotly_chart(fig, use_container_width=True)
     
     with col2:
         # Task priority distribution
-        priorities = {}
-        for task in filtered_tasks:
-            priority = task["priority"]
-            if priority not in priorities:
-                priorities[priority] = 0
-            priorities[priority] += 1
-        
-        if priorities:
-            df = pd.DataFrame({"Priority": list(priorities.keys()), "Count": list(priorities.values())})
-            fig = px.bar(
-                df,
-                x="Priority",
-                y="Count",
-                title="Tasks by Priority",
-                color="Priority",
-                color_discrete_map={
-                    "High": "red",
-                    "Medium": "orange",
-                    "Low": "blue"
-                }
-            )
+        fig = cached_figure("gantt_priorities", lambda: task_priority_chart(filtered_tasks.counts("priority")), **filters)
+        if fig:
             st.plotly_chart(fig, use_container_width=True)
     
     # Timeline view
     st.markdown("### Project Timeline")
     
-    if filtered_tasks:
-        # Sort tasks by start date
-        sorted_tasks = sorted(filtered_tasks, key=lambda x: x["start_date"])
-        
-        # Get earliest and latest dates
-        start_dates = [datetime.strptime(task["start_date"], "%Y-%m-%d") for task in sorted_tasks]
-        end_dates = [datetime.strptime(task["end_date"], "%Y-%m-%d") for task in sorted_tasks]
-        
-        min_date = min(start_dates)
-        max_date = max(end_dates)
-        
-        # Generate timeline data
-        timeline_data = []
-        for i, task in enumerate(sorted_tasks):
-            start = datetime.strptime(task["start_date"], "%Y-%m-%d")
-            end = datetime.strptime(task["end_date"], "%Y-%m-%d")
-            
-            timeline_data.append({
-                "Task": task["title"],
-                "Start": start,
-                "End": end,
-                "Partner": task["assigned_to"],
-                "Status": task["status"]
-            })
+    if shown_tasks:
+        if len(visible_tasks) > len(shown_tasks):
+            st.caption(f"Showing the first {len(shown_tasks)} of {len(visible_tasks)} tasks in this window.")
         
-        timeline_df = pd.DataFrame(timeline_data)
+        # Tasks are already sorted by start date; the frame carries the pre-parsed dates
+        timeline_df = shown_tasks.frame().rename(columns={
+            "title": "Task",
+            "start_date": "Start",
+            "end_date": "End",
+            "assigned_to": "Partner",
+            "status": "Status"
+        })
         
         # Create timeline chart
         fig = px.timeline(
@@ -1402,14 +1121,15 @@ def display_gantt_chart(organization):
                 type='date',
                 title="Date",
                 tickformat="%d %b %Y",
-                title_font=dict(size=14)
+                title_font=dict(size=14),
+                range=[window_start, window_end]
             ),
             yaxis=dict(
                 title="",
                 tickangle=0,
                 automargin=True
             ),
-            height=max(400, len(sorted_tasks) * 30),
+            height=max(400, len(timeline_df) * 30),
             margin=dict(t=50, b=50, l=20, r=20)
         )
         
@@ -1417,12 +1137,10 @@ def display_gantt_chart(organization):
     else:
         st.info("No tasks found to display in the timeline.")
 
+@traced()
 def display_reports(organization):
     st.title("Reports Management")
     
-    # Get reports relevant to the current user
-    reports = get_user_reports(st.session_state.current_user)
-    
     # Report filtering options
     st.markdown("### Filter Reports")
     col1, col2 = st.columns(2)
@@ -1436,12 +1154,12 @@ def display_reports(organization):
         else:
             filter_partner = [organization]
     
-    # Apply filters
-    filtered_reports = [
-        report for report in reports 
-        if report["status"] in filter_status 
-        and report["partner"] in filter_partner
-    ]
+    # Get the reports relevant to the current user that match the filters
+    filtered_reports = get_user_reports(
+        st.session_state.current_user,
+        status=filter_status,
+        partners=filter_partner
+    )
     
     # Create new report
     st.markdown("### Report Management")
@@ -1506,19 +1224,22 @@ def display_reports(organization):
     # Report submission chart (for admin only)
     if st.session_state.is_admin:
         st.markdown("### Report Submission Status")
-        submission_fig = report_submission_chart(reports)
+        submission_fig = cached_figure(
+            "report_submission",
+            lambda: report_submission_chart(get_report_service().status_counts())
+        )
         if submission_fig:
             st.plotly_chart(submission_fig, use_container_width=True)
     
     # Report list
     st.markdown("### Report List")
-    st.markdown(f"Showing {len(filtered_reports)} reports")
+    # Sort by submission date, newest first
+    sorted_reports = sorted(filtered_reports, key=lambda x: x["submission_date"], reverse=True)
+    start, end = paginate(len(sorted_reports), "reports", "reports")
+    page_reports = sorted_reports[start:end]
     
-    if filtered_reports:
-        # Sort by submission date, newest first
-        sorted_reports = sorted(filtered_reports, key=lambda x: x["submission_date"], reverse=True)
-        
-        for report in sorted_reports:
+    if page_reports:
+        for report in page_reports:
             with st.expander(f"{report['title']} - {report['partner']} ({report['status']})"):
                 col1, col2 = st.columns([1, 1])
                 
@@ -1540,3 +1261,100 @@ def display_reports(organization):
                 st.markdown(report['issues'] or "None")
                 st.markdown("")
                 st.markdown("---")
+
+@traced()
+def display_search(organization):
+    st.title("Search")
+    
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        text = st.text_input("Search tasks, reports and documents", key="search_text")
+    with col2:
+        kinds = st.multiselect("In", list(SEARCH_COLUMNS), default=list(SEARCH_COLUMNS),
+                               format_func=str.capitalize, key="search_kinds")
+    
+    if not text:
+        st.info("Enter words to search for; each word also matches longer words it starts.")
+        return
+    
+    results = get_dataset().view(st.session_state.current_user).search(text, kinds)
+    if not results:
+        st.info("No matches found.")
+        return
+    
+    st.caption(f"Top {len(results)} matches, best first")
+    for hit in results:
+        if hit["kind"] == "tasks":
+            details = f"Task · {hit['assigned_to']} · {hit['status']} · due {format_date(hit['end_date'])}"
+        elif hit["kind"] == "reports":
+            details = f"Report · {hit['partner']} · {hit['status']} · {format_date(hit['submission_date'])}"
+        else:
+            details = f"Document · {hit['category']} · uploaded {format_date(hit['upload_date'])}"
+        st.markdown(f"""
+        <div style="padding: 10px; margin-bottom: 10px; border-radius: 5px; background-color: #f9f9f9;">
+            <strong>{marked_html(hit['title_match'])}</strong><br>
+            <small>{html.escape(details)}</small><br>
+            {marked_html(hit['snippet'])}
+        </div>
+        """, unsafe_allow_html=True)
+
+def profile_frame(stats):
+    """Span table for the Performance panel, slowest first"""
+    rows = [
+        {
+            "Span": name,
+            "Calls": calls,
+            "Total (ms)": seconds * 1000,
+            "Mean (ms)": seconds * 1000 / calls,
+            "Allocated (KiB)": allocated / 1024
+        }
+        for name, (calls, seconds, allocated) in stats.items()
+    ]
+    return pd.DataFrame(rows, columns=["Span", "Calls", "Total (ms)", "Mean (ms)", "Allocated (KiB)"]) \
+        .sort_values("Total (ms)", ascending=False)
+
+def display_settings():
+    st.title("Settings")
+    
+    st.markdown("### Performance")
+    st.caption("Tracing applies to every session served by this process.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        TRACER.enabled = st.checkbox("Trace data functions, pages and figures", value=TRACER.enabled)
+    with col2:
+        allocations = st.checkbox(
+            "Track allocated bytes (slows the app down)",
+            value=TRACER.allocations,
+            disabled=not TRACER.enabled
+        )
+        TRACER.track_allocations(TRACER.enabled and allocations)
+    
+    if not TRACER.enabled:
+        st.info("Tracing is off.")
+        return
+    
+    profile = st.session_state.get("rerun_profile")
+    st.markdown("#### Previous rerun")
+    if profile:
+        st.dataframe(profile_frame(profile), hide_index=True, use_container_width=True)
+    else:
+        st.caption("No traced rerun yet.")
+    
+    st.markdown("#### Since start")
+    totals = TRACER.totals()
+    if totals:
+        st.dataframe(profile_frame(totals), hide_index=True, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            "Download Prometheus metrics",
+            TRACER.prometheus(),
+            file_name="pmt_metrics.prom",
+            mime="text/plain; version=0.0.4"
+        )
+    with col2:
+        if st.button("Reset totals"):
+            TRACER.reset()
+            st.rerun()
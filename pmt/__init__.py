@@ -0,0 +1,27 @@
+"""Storage, read model and services behind the TechSight project management app
+
+pmt.py is the Streamlit view over this package. Nothing in here imports
+Streamlit, so the services run the same in a test, a batch job or a worker
+process as they do behind the app.
+"""
+from pmt.dataset import SharedDataset, TaskTable, UserView
+from pmt.events import NotificationQueue
+from pmt.services import (
+    AuthService, NotificationService, ReportService, TaskService, compute_dashboard_metrics, prepare_database
+)
+from pmt.store import Database, EditConflict
+
+__all__ = [
+    "AuthService",
+    "Database",
+    "EditConflict",
+    "NotificationQueue",
+    "NotificationService",
+    "ReportService",
+    "SharedDataset",
+    "TaskService",
+    "TaskTable",
+    "UserView",
+    "compute_dashboard_metrics",
+    "prepare_database",
+]
@@ -0,0 +1,92 @@
+"""Password hashing, the logged-in identity and login throttling"""
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from pmt.constants import (
+    LOGIN_BASE_DELAY, LOGIN_FAILURE_WINDOW, LOGIN_FREE_ATTEMPTS, LOGIN_MAX_DELAY, LOGIN_THROTTLE_ENTRIES,
+    PASSWORD_SCRYPT_MAXMEM, PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_P, PASSWORD_SCRYPT_R
+)
+
+
+def hash_password(password, n=PASSWORD_SCRYPT_N, r=PASSWORD_SCRYPT_R, p=PASSWORD_SCRYPT_P):
+    """scrypt hash of a password as "scrypt$n$r$p$salt$digest", parameters included"""
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=PASSWORD_SCRYPT_MAXMEM)
+    return f"scrypt${n}${r}${p}${salt.hex()}${digest.hex()}"
+
+def is_password_hash(stored):
+    return stored.startswith("scrypt$")
+
+def verify_password(password, stored):
+    if not is_password_hash(stored):
+        return False
+    _, n, r, p, salt, digest = stored.split("$")
+    candidate = hashlib.scrypt(
+        password.encode(), salt=bytes.fromhex(salt), n=int(n), r=int(r), p=int(p), maxmem=PASSWORD_SCRYPT_MAXMEM
+    )
+    return hmac.compare_digest(candidate, bytes.fromhex(digest))
+
+@lru_cache(maxsize=1)
+def dummy_password_hash():
+    """Hash of a random password, checked for unknown usernames so they take as long to refuse as known ones"""
+    return hash_password(os.urandom(16).hex())
+
+def password_needs_rehash(stored):
+    return not stored.startswith(f"scrypt${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}$")
+
+
+@dataclass(frozen=True)
+class Identity:
+    """The logged-in user, cached in the session so pages don't look it up on every call"""
+    username: str
+    name: str
+    role: str
+    organization: str
+    email: str
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user["username"], user["name"], user["role"], user["organization"], user["email"])
+
+
+class LoginThrottle:
+    """Per-username failed-login counter with exponential lockout, shared by every session
+
+    Locked attempts are refused before the password is hashed, so guessing
+    can't keep the KDF workers busy.
+    """
+
+    def __init__(self):
+        self._failures = OrderedDict()  # username -> (failures, last failure, locked until)
+        self._lock = threading.Lock()
+
+    def retry_after(self, username):
+        """Seconds until username may try again, 0 if it may try now"""
+        with self._lock:
+            entry = self._failures.get(username)
+        return max(0.0, entry[2] - time.monotonic()) if entry else 0.0
+
+    def failed(self, username):
+        now = time.monotonic()
+        with self._lock:
+            failures, last, _ = self._failures.pop(username, (0, now, 0.0))
+            if now - last > LOGIN_FAILURE_WINDOW:
+                failures = 0
+            failures += 1
+            locked_until = 0.0
+            if failures >= LOGIN_FREE_ATTEMPTS:
+                delay = LOGIN_BASE_DELAY * 2 ** (failures - LOGIN_FREE_ATTEMPTS)
+                locked_until = now + min(delay, LOGIN_MAX_DELAY)
+            self._failures[username] = (failures, now, locked_until)
+            while len(self._failures) > LOGIN_THROTTLE_ENTRIES:
+                self._failures.popitem(last=False)
+
+    def succeeded(self, username):
+        with self._lock:
+            self._failures.pop(username, None)
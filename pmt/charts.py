@@ -0,0 +1,277 @@
+"""Plotly figure builders; they take prepared data and never query"""
+from pmt.constants import REPORT_STATUS, TASK_STATUS
+from pmt.lazy import ff, pd, px
+from pmt.tracing import traced
+
+
+@traced()
+def create_gantt_chart(tasks, window=None):
+    if not tasks:
+        return None
+    
+    # Prepare data for Gantt chart
+    df = []
+    for task in tasks:
+        task_status = task["status"]
+        color = ""
+        if task_status == "Completed":
+            color = "rgb(0, 128, 0)"  # Green
+        elif task_status == "In Progress":
+            color = "rgb(30, 144, 255)"  # Blue
+        elif task_status == "Not Started":
+            color = "rgb(192, 192, 192)"  # Gray
+        elif task_status == "Delayed":
+            color = "rgb(255, 165, 0)"  # Orange
+        else:  # Cancelled
+            color = "rgb(255, 0, 0)"  # Red
+        
+        df.append(dict(
+            Task=task["title"],
+            Start=task["start_date"],
+            Finish=task["end_date"],
+            Partner=task["assigned_to"],
+            Status=task_status,
+            Description=task["description"],
+            Resource=task["category"],
+            Progress=task["progress"],
+            Priority=task["priority"],
+            color=color
+        ))
+    
+    if not df:
+        return None
+    
+    fig = ff.create_gantt(
+        df,
+        colors={task["Status"]: task["color"] for task in df},
+        index_col='Status',
+        show_colorbar=True,
+        group_tasks=True,
+        showgrid_x=True,
+        showgrid_y=True,
+        title="TechSight Project Gantt Chart"
+    )
+    
+    # Update layout for better visibility
+    fig.update_layout(
+        autosize=True,
+        margin=dict(l=10, r=10, b=10, t=50),
+        title_font=dict(size=24),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        height=600
+    )
+    
+    if window:
+        fig.update_xaxes(range=list(window))
+    
+    return fig
+
+@traced()
+def create_rollup_gantt_chart(task_df, group_by, window=None):
+    """One bar per partner or category spanning its tasks, for windows with too many tasks to draw"""
+    if task_df.empty:
+        return None
+    
+    rollup = task_df.groupby(group_by, observed=True).agg(
+        Start=("start_date", "min"),
+        Finish=("end_date", "max"),
+        Tasks=("id", "size"),
+        Progress=("progress", "mean")
+    ).reset_index()
+    label = "Partner" if group_by == "assigned_to" else "Category"
+    rollup[label] = rollup[group_by].astype(str)
+    
+    fig = px.timeline(
+        rollup,
+        x_start="Start",
+        x_end="Finish",
+        y=label,
+        color="Progress",
+        range_color=(0, 100),
+        color_continuous_scale="Blues",
+        hover_data={"Tasks": True, "Progress": ":.0f"},
+        title=f"TechSight Project Gantt Chart by {label}"
+    )
+    
+    fig.update_yaxes(autorange="reversed", title="")
+    fig.update_layout(
+        autosize=True,
+        margin=dict(l=10, r=10, b=10, t=50),
+        title_font=dict(size=24),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        height=max(400, len(rollup) * 40)
+    )
+    
+    if window:
+        fig.update_xaxes(range=list(window))
+    
+    return fig
+
+@traced()
+def task_progress_chart(status_counts):
+    tasks_by_status = status_counts.sum()
+    tasks_by_status = tasks_by_status[tasks_by_status > 0]
+    if tasks_by_status.empty:
+        return None
+    
+    status_counts = pd.DataFrame({"Status": tasks_by_status.index.astype(str), "Count": tasks_by_status.to_numpy()})
+    
+    # Create pie chart
+    fig = px.pie(
+        status_counts,
+        values="Count",
+        names="Status",
+        title="Task Status Distribution",
+        color="Status",
+        color_discrete_map={
+            "Completed": "green",
+            "In Progress": "blue",
+            "Not Started": "gray",
+            "Delayed": "orange",
+            "Cancelled": "red"
+        }
+    )
+    
+    fig.update_layout(
+        margin=dict(t=50, b=20, l=20, r=20),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5)
+    )
+    
+    return fig
+
+@traced()
+def partner_task_distribution(status_counts):
+    partner_df = status_counts[status_counts.sum(axis=1) > 0]
+    if partner_df.empty:
+        return None
+    
+    partner_df = partner_df.reset_index().rename(columns={"assigned_to": "Partner"})
+    partner_df.columns = [str(c) for c in partner_df.columns]
+    partner_df["Partner"] = partner_df["Partner"].astype(str)
+    partner_df["Total"] = partner_df[TASK_STATUS].sum(axis=1)
+    
+    # Create stacked bar chart
+    fig = px.bar(
+        partner_df,
+        x="Partner",
+        y=["Completed", "In Progress", "Not Started", "Delayed", "Cancelled"],
+        title="Task Distribution by Partner",
+        color_discrete_map={
+            "Completed": "green",
+            "In Progress": "blue",
+            "Not Started": "gray",
+            "Delayed": "orange",
+            "Cancelled": "red"
+        },
+        labels={"value": "Number of Tasks", "variable": "Status"},
+        text_auto=True
+    )
+    
+    fig.update_layout(
+        xaxis_title="",
+        yaxis_title="Number of Tasks",
+        legend_title="Task Status",
+        font=dict(size=12),
+        xaxis={'categoryorder':'total descending'},
+        margin=dict(t=50, b=150),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.5, xanchor="center", x=0.5)
+    )
+    
+    fig.update_xaxes(tickangle=45)
+    
+    return fig
+
+@traced()
+def report_submission_chart(status_counts):
+    report_df = status_counts[status_counts.sum(axis=1) > 0]
+    if report_df.empty:
+        return None
+    
+    report_df = report_df.reset_index().rename(columns={"partner": "Partner"})
+    report_df.columns = [str(c) for c in report_df.columns]
+    report_df["Partner"] = report_df["Partner"].astype(str)
+    report_df["Total"] = report_df[REPORT_STATUS].sum(axis=1)
+    report_df["Submission Rate"] = report_df["Submitted"] / report_df["Total"] * 100
+    
+    # Create bar chart
+    fig = px.bar(
+        report_df,
+        x="Partner",
+        y=["Submitted", "Pending", "Draft"],
+        title="Report Submission Status by Partner",
+        color_discrete_map={
+            "Submitted": "green",
+            "Pending": "orange",
+            "Draft": "gray"
+        },
+        labels={"value": "Number of Reports", "variable": "Status"},
+        text_auto=True
+    )
+    
+    fig.update_layout(
+        xaxis_title="",
+        yaxis_title="Number of Reports",
+        legend_title="Report Status",
+        font=dict(size=12),
+        margin=dict(t=50, b=150),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.5, xanchor="center", x=0.5)
+    )
+    
+    fig.update_xaxes(tickangle=45)
+    
+    return fig
+
+@traced()
+def category_share_chart(category_counts):
+    category_counts = category_counts[category_counts > 0]
+    if category_counts.empty:
+        return None
+    
+    df = pd.DataFrame({"Category": category_counts.index.astype(str), "Count": category_counts.to_numpy()})
+    return px.pie(
+        df,
+        values="Count",
+        names="Category",
+        title="Tasks by Category",
+        hole=0.4
+    )
+
+@traced()
+def task_priority_chart(priority_counts):
+    priority_counts = priority_counts[priority_counts > 0]
+    if priority_counts.empty:
+        return None
+    
+    df = pd.DataFrame({"Priority": priority_counts.index.astype(str), "Count": priority_counts.to_numpy()})
+    return px.bar(
+        df,
+        x="Priority",
+        y="Count",
+        title="Tasks by Priority",
+        color="Priority",
+        color_discrete_map={
+            "High": "red",
+            "Medium": "orange",
+            "Low": "blue"
+        }
+    )
+
+@traced()
+def task_category_chart(category_counts, organization):
+    category_counts = category_counts[category_counts > 0]
+    if category_counts.empty:
+        return None
+    
+    df = pd.DataFrame({"Category": category_counts.index.astype(str), "Count": category_counts.to_numpy()})
+    fig = px.bar(
+        df,
+        x="Category",
+        y="Count",
+        title=f"Tasks by Category for {organization}",
+        color="Category"
+    )
+    fig.update_layout(xaxis_title="", yaxis_title="Number of Tasks")
+    
+    return fig
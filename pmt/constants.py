@@ -0,0 +1,123 @@
+"""Project vocabulary and tuning knobs shared by the store, services and views"""
+import os
+
+
+PARTNERS = [
+    "Yildiz Technical University (YTU)",
+    "THE NEW WAY",
+    "Ss. Cyril and Methodius University in Skopje",
+    "Politecnico da Guarda",
+    "HOCHSCHULE MAGDEBURG-STENDAL",
+    "Center for the Promotion of Science",
+    "Daugavpils Universitate"
+]
+
+TASK_CATEGORIES = [
+    "Project Management",
+    "Research",
+    "Development",
+    "Implementation",
+    "Dissemination",
+    "Quality Assurance",
+    "Reporting"
+]
+
+TASK_STATUS = ["Not Started", "In Progress", "Completed", "Delayed", "Cancelled"]
+
+TASK_PRIORITIES = ["High", "Medium", "Low"]
+
+REPORT_STATUS = ["Submitted", "Pending", "Draft"]
+
+TASK_SORT_OPTIONS = {
+    "Start Date": "start_date",
+    "End Date": "end_date",
+    "Status": "status",
+    "Progress": "progress",
+    "Priority": "priority"
+}
+PRIORITY_RANK = {"High": 3, "Medium": 2, "Low": 1}
+OPEN_TASK_STATUS = [s for s in TASK_STATUS if s not in ["Completed", "Cancelled"]]
+
+# Ids are "<prefix>_<zero-padded sequence number>", so sorting by id sorts by
+# creation order.
+ID_WIDTH = 10
+
+PAGE_SIZES = [10, 25, 50, 100]
+DASHBOARD_RECENT_ITEMS = 5
+COMMENT_PAGE_SIZE = 20
+
+# Search results per page, the length of body snippets in tokens, the shortest
+# last word matched as a prefix, and the control characters that mark matches
+# until they are rendered as <mark>
+SEARCH_RESULT_LIMIT = 50
+SEARCH_SNIPPET_TOKENS = 16
+SEARCH_MIN_PREFIX = 3
+SEARCH_MARKS = ("\x02", "\x03")
+
+# Above this many tasks in the visible window the Gantt chart rolls tasks up
+GANTT_MAX_TASKS = 100
+GANTT_LEVELS = {
+    "Auto": None,
+    "Individual tasks": None,
+    "Roll up by partner": "assigned_to",
+    "Roll up by category": "category"
+}
+QUERY_CHUNK_SIZE = 4096
+
+# Notifications beyond the newest NOTIFICATION_INBOX_LIMIT per organization,
+# or older than NOTIFICATION_RETENTION_DAYS, are moved to the archive table
+NOTIFICATION_INBOX_LIMIT = 500
+NOTIFICATION_ARCHIVE_BATCH = 50
+NOTIFICATION_RETENTION_DAYS = 180
+NOTIFICATION_SIDEBAR_LIMIT = 10
+
+# The notification worker waits this long after the first event of a batch
+# so bursts (e.g. bulk edits) are written together and folded into digests
+NOTIFICATION_BATCH_WINDOW = 0.5
+NOTIFICATION_BATCH_SIZE = 500
+NOTIFICATION_DIGEST_TITLES = 3
+
+# Passwords are stored as scrypt hashes. Raising the cost parameters takes
+# effect for each user at their next successful login.
+PASSWORD_SCRYPT_N = 2 ** 14
+PASSWORD_SCRYPT_R = 8
+PASSWORD_SCRYPT_P = 1
+PASSWORD_SCRYPT_MAXMEM = 64 * 1024 * 1024
+PASSWORD_HASH_WORKERS = 2
+
+# After LOGIN_FREE_ATTEMPTS failures in a row a username is locked for a delay
+# that doubles with every further failure, up to LOGIN_MAX_DELAY seconds.
+# Failures older than LOGIN_FAILURE_WINDOW seconds are forgotten.
+LOGIN_FREE_ATTEMPTS = 5
+LOGIN_BASE_DELAY = 1
+LOGIN_MAX_DELAY = 300
+LOGIN_FAILURE_WINDOW = 900
+LOGIN_THROTTLE_ENTRIES = 10000
+
+# Tracing of data functions, pages and figure builds; both can also be
+# switched on from the admin Performance panel. Allocation tracking runs
+# tracemalloc, which slows everything down noticeably.
+PROFILING = os.environ.get("PMT_PROFILING", "") == "1"
+PROFILE_ALLOCATIONS = os.environ.get("PMT_PROFILE_ALLOCATIONS", "") == "1"
+
+# Every task and report change is appended to a log in the database. The
+# shared task table is saved as a snapshot file once SNAPSHOT_INTERVAL changes
+# have been applied since the last one; at startup it is loaded from there and
+# only the log after it is replayed. A tail longer than TASK_REPLAY_LIMIT (e.g.
+# after a big import) is cheaper to reload from the tasks table.
+SNAPSHOT_INTERVAL = 1000
+SNAPSHOT_FORMAT = "1"
+TASK_REPLAY_LIMIT = 5000
+TASK_HISTORY_LIMIT = 20
+
+FIGURE_CACHE_SIZE = 128
+DATE_FORMAT_CACHE_SIZE = 8192
+FRAME_CACHE_SIZE = 64
+
+# Exports are encoded EXPORT_CHUNK_SIZE rows at a time straight from a database
+# cursor; imports are validated up front and inserted IMPORT_BATCH_SIZE rows
+# per transaction
+EXPORT_FORMATS = {"CSV": "csv", "JSON Lines": "jsonl", "Parquet": "parquet"}
+EXPORT_MIME_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+EXPORT_CHUNK_SIZE = 5000
+IMPORT_BATCH_SIZE = 5000
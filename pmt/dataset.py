@@ -0,0 +1,641 @@
+"""Process-wide read model over the store, scoped per user"""
+import heapq
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager
+from datetime import date
+from functools import lru_cache
+
+from pmt.constants import (
+    DATE_FORMAT_CACHE_SIZE, OPEN_TASK_STATUS, PARTNERS, PRIORITY_RANK, QUERY_CHUNK_SIZE, SEARCH_RESULT_LIMIT,
+    SNAPSHOT_FORMAT, SNAPSHOT_INTERVAL, TASK_CATEGORIES, TASK_PRIORITIES, TASK_REPLAY_LIMIT, TASK_STATUS
+)
+from pmt.lazy import np, pa, pd
+from pmt.store import SEARCH_COLUMNS, TASK_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    """Process-wide LRU of derived values (figures, frames) tagged with the data version"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._figures = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get_or_build(self, version, key, builder):
+        with self._lock:
+            if self._version is None or version > self._version:
+                # The data changed, so every cached figure is stale
+                self._figures.clear()
+                self._version = version
+            elif version == self._version and key in self._figures:
+                self._figures.move_to_end(key)
+                return self._figures[key]
+        
+        # Build outside the lock so sessions rendering other charts don't wait
+        fig = builder()
+        
+        with self._lock:
+            if version == self._version:
+                self._figures[key] = fig
+                while len(self._figures) > self.max_entries:
+                    self._figures.popitem(last=False)
+        return fig
+
+
+class ReadWriteLock:
+    """Many concurrent readers or a single writer; waiting writers block new readers"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class SharedDataset:
+    """Process-wide read model over the database, shared by every session
+
+    Sessions hold no copy of the project data; they read the current task
+    snapshot and user records from here through a UserView. The task snapshot
+    is kept current by replaying the change log onto it; with a snapshot_path
+    it is also saved there now and then and loaded from there on startup.
+    """
+
+    def __init__(self, db, snapshot_path=None):
+        self.db = db
+        self.snapshot_path = snapshot_path
+        self._lock = ReadWriteLock()
+        self._tasks = None
+        self._tasks_version = None
+        self._tasks_seq = None
+        self._snapshot_seq = None
+        self._saving = threading.Lock()
+        self._users = {}
+
+    def task_table(self):
+        version = self.db.data_version()
+        with self._lock.read():
+            if self._tasks_version == version:
+                return self._tasks
+        
+        # Only one session refreshes a stale snapshot; the others wait and share it
+        with self._lock.write():
+            if self._tasks_version is None or self._tasks_version < version:
+                self._refresh_tasks()
+                self._tasks_version = version
+            tasks, seq = self._tasks, self._tasks_seq
+        
+        if self.snapshot_path is not None and (self._snapshot_seq is None
+                                               or seq - self._snapshot_seq >= SNAPSHOT_INTERVAL):
+            self._save_snapshot(tasks, seq)
+        return tasks
+
+    def _refresh_tasks(self):
+        """Bring the task snapshot up to the end of the change log"""
+        if self._tasks is None and self.snapshot_path is not None:
+            tasks, seq = TaskTable.load(self.snapshot_path, self.db.database_id())
+            # A snapshot ahead of the log has changes the database lost in a crash
+            if tasks is not None and seq <= self.db.change_head():
+                self._tasks, self._tasks_seq = tasks, seq
+                self._snapshot_seq = seq
+        
+        if self._tasks is not None:
+            tail = self.db.changes_since(self._tasks_seq, entity="task", limit=TASK_REPLAY_LIMIT + 1)
+            if len(tail) <= TASK_REPLAY_LIMIT:
+                if tail:
+                    self._tasks = self._tasks.apply(tail)
+                    self._tasks_seq = tail[-1]["seq"]
+                return
+        
+        # The log position is read first: changes made while the table is read
+        # are replayed again next time, which leaves them as they are
+        self._tasks_seq = self.db.change_head()
+        self._tasks = TaskTable(self.db.task_table(TaskTable.FIELDS))
+
+    def _save_snapshot(self, tasks, seq):
+        """Save the task snapshot on a background thread, unless a save is already running"""
+        if not self._saving.acquire(blocking=False):
+            return
+        self._snapshot_seq = seq
+        
+        def save():
+            try:
+                tasks.save(self.snapshot_path, seq, self.db.database_id())
+            except Exception:
+                logger.exception("Failed to save the task snapshot to %s", self.snapshot_path)
+            finally:
+                self._saving.release()
+        
+        threading.Thread(target=save, name="pmt-task-snapshot", daemon=True).start()
+
+    def user(self, username):
+        with self._lock.read():
+            if username in self._users:
+                return self._users[username]
+        
+        user = self.db.get_user(username)
+        if user is not None:
+            with self._lock.write():
+                self._users[username] = user
+        return user
+
+    def view(self, username):
+        return UserView(self, self.user(username))
+
+
+class UserView:
+    """One user's window onto the shared dataset, scoped by role and organization"""
+
+    def __init__(self, dataset, user):
+        self.dataset = dataset
+        self.user = user
+
+    def scope(self, partners=None):
+        """assigned_to/partner filter for this user, or [] (nothing) for unknown users"""
+        return user_partner_filter(self.user, partners) if self.user else []
+
+    def tasks(self, status=None, category=None, partners=None, due_from=None):
+        return self.dataset.task_table().select(
+            assigned_to=self.scope(partners),
+            status=status,
+            category=category,
+            due_from=due_from
+        )
+
+    def query_tasks(self, filters=None, sort_by=None, ascending=True):
+        filters = dict(filters or {})
+        partners = filters.pop("partners", None)
+        return self.dataset.task_table().query(
+            sort_by=sort_by,
+            ascending=ascending,
+            assigned_to=self.scope(partners),
+            **filters
+        )
+
+    def task(self, task_id):
+        task = self.dataset.task_table().get(task_id)
+        if not self.user or not task:
+            return None
+        
+        if self.user["role"] == "admin" or task["assigned_to"] == self.user["organization"]:
+            return task
+        return None
+
+    def recent_tasks(self, limit):
+        return self.query_tasks(sort_by="start_date", ascending=False).page(0, limit)
+
+    def upcoming_deadlines(self, today, limit):
+        """Open tasks due on or after today, nearest deadline first"""
+        return self.query_tasks(
+            {"status": OPEN_TASK_STATUS, "due_from": today.strftime("%Y-%m-%d")},
+            sort_by="end_date"
+        ).page(0, limit)
+
+    def recent_reports(self, limit):
+        if not self.user:
+            return []
+        return self.dataset.db.recent_reports(partner=self.scope(), limit=limit)
+
+    def comment_threads(self, task_id, limit, offset=0):
+        """(number of threads, newest threads) of a task the user can see"""
+        if self.task(task_id) is None:
+            return 0, []
+        db = self.dataset.db
+        return db.count_comment_threads(task_id), db.list_comment_threads(task_id, limit, offset)
+
+    def count_comment_matches(self, text):
+        if not self.user:
+            return 0
+        return self.dataset.db.count_comment_matches(text, assigned_to=self.scope())
+
+    def search_comments(self, text, limit, offset=0):
+        if not self.user:
+            return []
+        return self.dataset.db.search_comments(text, assigned_to=self.scope(), limit=limit, offset=offset)
+
+    def search(self, text, tables=tuple(SEARCH_COLUMNS), limit=SEARCH_RESULT_LIMIT):
+        """Ranked matches across tasks, reports and documents, best first"""
+        if not self.user:
+            return []
+        hits = [
+            {**row, "kind": table}
+            for table in tables
+            for row in self.dataset.db.search(table, text, scope=self.scope(), limit=limit)
+        ]
+        return heapq.nsmallest(limit, hits, key=lambda hit: hit["score"])
+
+    def reports(self, status=None, partners=None):
+        if not self.user:
+            return []
+        return self.dataset.db.list_reports(partner=self.scope(partners), status=status)
+
+    def notifications(self, unread_only=False, limit=None):
+        if not self.user:
+            return []
+        return self.dataset.db.list_notifications(self.user["organization"], unread_only=unread_only, limit=limit)
+
+
+class TaskTable:
+    """Read-only, column-oriented snapshot of the tasks table
+
+    Enum-like fields are held as small integer codes and dates as day
+    ordinals, so a single snapshot can be shared by every session. Comments
+    are not part of it; they are paged from their own table. Rows are read
+    through TaskRecord views.
+    """
+
+    TEXT_COLUMNS = ("id", "title", "description")
+    CODED_COLUMNS = {
+        "assigned_to": PARTNERS,
+        "assigned_by": PARTNERS,
+        "category": TASK_CATEGORIES,
+        "status": TASK_STATUS,
+        "priority": TASK_PRIORITIES
+    }
+    DATE_COLUMNS = ("start_date", "end_date")
+    # Rows carry the record version so an edit form can save against what it read
+    FIELDS = TASK_FIELDS + ("version",)
+
+    def __init__(self, rows):
+        data = dict(zip(self.FIELDS, zip(*rows))) if rows else {field: () for field in self.FIELDS}
+        size = len(rows)
+        
+        text = {column: np.array(data[column], dtype=object) for column in self.TEXT_COLUMNS}
+        categories, codes = {}, {}
+        for column, known in self.CODED_COLUMNS.items():
+            categories[column] = list(known) + sorted(set(data[column]) - set(known))
+            lookup = {value: code for code, value in enumerate(categories[column])}
+            codes[column] = np.fromiter((lookup[v] for v in data[column]), dtype=np.int16, count=size)
+        days = {
+            column: np.fromiter((date.fromisoformat(v).toordinal() for v in data[column]), dtype=np.int32, count=size)
+            for column in self.DATE_COLUMNS
+        }
+        progress = np.array(data["progress"], dtype=np.int16)
+        versions = np.array(data["version"], dtype=np.int32)
+        self._set_columns(text, categories, codes, days, progress, versions)
+
+    def _set_columns(self, text, categories, codes, days, progress, versions):
+        self.size = len(progress)
+        self.text, self.categories, self.codes, self.days = text, categories, codes, days
+        self.progress, self.versions = progress, versions
+        self._lookup = {column: {value: code for code, value in enumerate(values)} for column, values in categories.items()}
+        self._row_by_id = {task_id: row for row, task_id in enumerate(text["id"])}
+        self._orders = {}
+
+    @classmethod
+    def _from_columns(cls, *columns):
+        table = cls.__new__(cls)
+        table._set_columns(*columns)
+        return table
+
+    def apply(self, changes):
+        """A new table with task change log entries (oldest first) applied; this one is left as is
+
+        Entries hold the whole task after the change, so applying one that is
+        already reflected here changes nothing.
+        """
+        latest = {change["record_id"]: change["data"] for change in changes}
+        updated = {self._row_by_id[task_id]: task for task_id, task in latest.items()
+                   if task is not None and task_id in self._row_by_id}
+        deleted = [self._row_by_id[task_id] for task_id, task in latest.items()
+                   if task is None and task_id in self._row_by_id]
+        inserted = sorted((task for task_id, task in latest.items()
+                           if task is not None and task_id not in self._row_by_id), key=lambda task: task["id"])
+        if not (updated or deleted or inserted):
+            return self
+        
+        rows = np.fromiter(updated, dtype=np.intp, count=len(updated))
+        keep = np.ones(self.size, dtype=bool)
+        keep[deleted] = False
+        
+        def merged(column, field, convert, dtype):
+            current = column.copy()
+            current[rows] = np.array([convert(task[field]) for task in updated.values()], dtype=dtype)
+            added = np.array([convert(task[field]) for task in inserted], dtype=dtype)
+            return np.concatenate([current[keep], added])
+        
+        text = {column: merged(self.text[column], column, str, object) for column in self.TEXT_COLUMNS}
+        categories, codes = {}, {}
+        for column in self.CODED_COLUMNS:
+            categories[column] = list(self.categories[column])
+            lookup = dict(self._lookup[column])
+            for task in [*updated.values(), *inserted]:
+                if task[column] not in lookup:
+                    lookup[task[column]] = len(categories[column])
+                    categories[column].append(task[column])
+            codes[column] = merged(self.codes[column], column, lookup.__getitem__, np.int16)
+        days = {
+            column: merged(self.days[column], column, lambda v: date.fromisoformat(v).toordinal(), np.int32)
+            for column in self.DATE_COLUMNS
+        }
+        progress = merged(self.progress, "progress", int, np.int16)
+        versions = merged(self.versions, "version", int, np.int32)
+        return self._from_columns(text, categories, codes, days, progress, versions)
+
+    def save(self, path, seq, database_id):
+        """Write the table as an Arrow file tagged with its database and the change log position it reflects
+
+        The file is written next to path and renamed into place, so a reader
+        never sees a partial snapshot.
+        """
+        arrays = {column: pa.array(self.text[column], type=pa.string()) for column in self.TEXT_COLUMNS}
+        for column in self.CODED_COLUMNS:
+            arrays[column] = pa.DictionaryArray.from_arrays(
+                pa.array(self.codes[column], type=pa.int16()), pa.array(self.categories[column], type=pa.string())
+            )
+        arrays.update((column, pa.array(self.days[column])) for column in self.DATE_COLUMNS)
+        arrays["progress"] = pa.array(self.progress)
+        arrays["version"] = pa.array(self.versions)
+        table = pa.table(arrays).replace_schema_metadata({
+            "format": SNAPSHOT_FORMAT, "database": str(database_id), "seq": str(seq)
+        })
+        
+        partial = f"{path}.partial"
+        with pa.OSFile(partial, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path, database_id):
+        """The table and change log position saved by save() for a database, or (None, None) if there is none"""
+        try:
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            metadata = table.schema.metadata or {}
+            if (metadata.get(b"format") != SNAPSHOT_FORMAT.encode()
+                    or metadata.get(b"database") != str(database_id).encode()):
+                return None, None
+            text = {column: table[column].to_numpy(zero_copy_only=False).astype(object) for column in cls.TEXT_COLUMNS}
+            categories, codes = {}, {}
+            for column in cls.CODED_COLUMNS:
+                values = table[column].combine_chunks()
+                categories[column] = values.dictionary.to_pylist()
+                codes[column] = values.indices.to_numpy().astype(np.int16)
+            days = {column: table[column].to_numpy().astype(np.int32) for column in cls.DATE_COLUMNS}
+            progress = table["progress"].to_numpy().astype(np.int16)
+            versions = table["version"].to_numpy().astype(np.int32)
+            seq = int(metadata[b"seq"])
+        except FileNotFoundError:
+            return None, None
+        except (OSError, KeyError, ValueError, pa.ArrowException):
+            logger.warning("Ignoring unreadable task snapshot %s", path, exc_info=True)
+            return None, None
+        return cls._from_columns(text, categories, codes, days, progress, versions), seq
+
+    def value(self, row, key):
+        if key in self.codes:
+            return self.categories[key][self.codes[key][row]]
+        if key in self.days:
+            return ordinal_to_iso(int(self.days[key][row]))
+        if key == "progress":
+            return int(self.progress[row])
+        if key == "version":
+            return int(self.versions[row])
+        if key in self.text:
+            return self.text[key][row]
+        raise KeyError(key)
+
+    def day(self, row, column):
+        return date.fromordinal(int(self.days[column][row]))
+
+    def get(self, task_id):
+        row = self._row_by_id.get(task_id)
+        return None if row is None else TaskRecord(self, row)
+
+    def _codes_for(self, column, values):
+        if isinstance(values, str):
+            values = [values]
+        lookup = self._lookup[column]
+        return [lookup[v] for v in values if v in lookup]
+
+    def _mask(self, rows=slice(None), assigned_to=None, status=None, category=None, due_from=None):
+        """Which of the given rows (all by default) match the filters"""
+        mask = np.ones(self.progress[rows].shape, dtype=bool)
+        for column, values in (("assigned_to", assigned_to), ("status", status), ("category", category)):
+            if values is not None:
+                mask &= np.isin(self.codes[column][rows], self._codes_for(column, values))
+        if due_from is not None:
+            mask &= self.days["end_date"][rows] >= date.fromisoformat(due_from).toordinal()
+        return mask
+
+    def select(self, **filters):
+        return TaskList(self, np.flatnonzero(self._mask(**filters)))
+
+    def _sort_key(self, sort_by):
+        if sort_by in self.days:
+            return self.days[sort_by]
+        if sort_by == "progress":
+            return self.progress
+        if sort_by == "status":
+            # Statuses sort by name, like the strings they are displayed as
+            names = self.categories["status"]
+            rank = np.argsort(np.argsort(np.array(names, dtype=object), kind="stable"))
+            return rank[self.codes["status"]]
+        if sort_by == "priority":
+            rank = np.array([PRIORITY_RANK.get(name, 0) for name in self.categories["priority"]])
+            return rank[self.codes["priority"]]
+        raise ValueError(f"Cannot sort tasks by {sort_by!r}")
+
+    def order(self, sort_by, ascending=True):
+        """Row order for a sort key, built once per snapshot and direction
+
+        Ties keep creation order in both directions, matching sorted(..., reverse=True).
+        """
+        if sort_by is None:
+            return np.arange(self.size)
+        
+        order = self._orders.get((sort_by, ascending))
+        if order is None:
+            key = self._sort_key(sort_by).astype(np.int64)
+            order = np.argsort(key if ascending else -key, kind="stable")
+            self._orders[(sort_by, ascending)] = order
+        return order
+
+    def query(self, sort_by=None, ascending=True, **filters):
+        order = self.order(sort_by, ascending)
+        due_from = filters.get("due_from")
+        if sort_by == "end_date" and ascending and due_from is not None:
+            # Everything due before due_from sits at the front of this order,
+            # so bisect past it instead of walking through the history
+            end_days = self._orders.get("end_date_sorted")
+            if end_days is None:
+                end_days = self._orders["end_date_sorted"] = self.days["end_date"][order]
+            order = order[np.searchsorted(end_days, date.fromisoformat(due_from).toordinal()):]
+        return TaskQuery(self, filters, order)
+
+    def frame(self, rows):
+        """Typed DataFrame of the given rows for vectorized aggregation"""
+        epoch = date(1970, 1, 1).toordinal()
+        df = pd.DataFrame({"id": self.text["id"][rows], "title": self.text["title"][rows]})
+        for column in self.CODED_COLUMNS:
+            df[column] = pd.Categorical.from_codes(self.codes[column][rows], self.categories[column])
+        for column in self.DATE_COLUMNS:
+            df[column] = (self.days[column][rows] - epoch).astype("datetime64[D]")
+        df["progress"] = self.progress[rows]
+        return df
+
+
+class TaskRecord(Mapping):
+    """Dict-like view of one row of a TaskTable"""
+
+    __slots__ = ("_table", "_row")
+    KEYS = TaskTable.FIELDS
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._table.value(self._row, key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    @property
+    def start_day(self):
+        return self._table.day(self._row, "start_date")
+
+    @property
+    def end_day(self):
+        return self._table.day(self._row, "end_date")
+
+
+class TaskList(Sequence):
+    """Sequence of TaskRecord views over selected rows of a TaskTable"""
+
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TaskList(self.table, self.rows[index])
+        return TaskRecord(self.table, int(self.rows[index]))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def frame(self):
+        return self.table.frame(self.rows)
+
+    def counts(self, column):
+        """Number of these tasks per value of a coded column, every known value included"""
+        categories = self.table.categories[column]
+        counts = np.bincount(self.table.codes[column][self.rows], minlength=len(categories))
+        return pd.Series(counts, index=pd.Index(categories, name=column))
+
+    def extent(self):
+        """(first start date, last end date) of these tasks"""
+        return (
+            date.fromordinal(int(self.table.days["start_date"][self.rows].min())),
+            date.fromordinal(int(self.table.days["end_date"][self.rows].max()))
+        )
+
+    def overlapping(self, window_start, window_end):
+        starts = self.table.days["start_date"][self.rows]
+        ends = self.table.days["end_date"][self.rows]
+        keep = (starts <= window_end.toordinal()) & (ends >= window_start.toordinal())
+        return TaskList(self.table, self.rows[keep])
+
+    def sorted_by(self, column):
+        return TaskList(self.table, self.rows[np.argsort(self.table.days[column][self.rows], kind="stable")])
+
+
+class TaskQuery:
+    """Filtered, sorted view of a TaskTable that is only materialized a page at a time"""
+
+    def __init__(self, table, filters, order):
+        self.table = table
+        self.filters = filters
+        self.order = order
+        self._mask = None
+
+    @property
+    def mask(self):
+        if self._mask is None:
+            self._mask = self.table._mask(**self.filters)
+        return self._mask
+
+    def count(self):
+        return int(np.count_nonzero(self.mask))
+
+    def _chunks(self):
+        # Until count() needs the full mask, filters are only evaluated for
+        # the chunks actually walked, so a top-k page touches a few rows
+        for start in range(0, len(self.order), QUERY_CHUNK_SIZE):
+            block = self.order[start:start + QUERY_CHUNK_SIZE]
+            if self._mask is not None:
+                yield block[self._mask[block]]
+            else:
+                yield block[self.table._mask(block, **self.filters)]
+
+    def page(self, offset, limit):
+        """Rows offset..offset+limit, walking the pre-sorted order only until the page is full"""
+        needed = offset + limit
+        hits, found = [], 0
+        for rows in self._chunks():
+            hits.append(rows)
+            found += len(rows)
+            if found >= needed:
+                break
+        rows = np.concatenate(hits)[offset:needed] if hits else np.empty(0, dtype=np.int64)
+        return TaskList(self.table, rows)
+
+    def __iter__(self):
+        for rows in self._chunks():
+            for row in rows:
+                yield TaskRecord(self.table, int(row))
+
+def user_partner_filter(user, partners=None):
+    """The assigned_to/partner filter a user may see, narrowed by the requested partners"""
+    if user["role"] == "admin":
+        return partners
+    elif partners is not None and user["organization"] not in partners:
+        return []
+    else:
+        return user["organization"]
+
+@lru_cache(maxsize=DATE_FORMAT_CACHE_SIZE)
+def ordinal_to_iso(ordinal):
+    return date.fromordinal(ordinal).strftime("%Y-%m-%d")
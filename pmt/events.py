@@ -0,0 +1,144 @@
+"""Domain events and the queue that turns them into notifications"""
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from pmt.constants import NOTIFICATION_BATCH_SIZE, NOTIFICATION_BATCH_WINDOW, NOTIFICATION_DIGEST_TITLES
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TaskAssigned:
+    recipient: str
+    title: str
+    reassigned: bool = False
+    
+    type = "task_assignment"
+    digest_label = "tasks assigned to you"
+    count = 1
+    
+    def message(self):
+        if self.reassigned:
+            return f"Task reassigned to you: {self.title}"
+        return f"New task assigned: {self.title}"
+
+
+@dataclass(frozen=True)
+class ReportSubmitted:
+    recipient: str
+    partner: str
+    title: str
+    status_change: bool = False
+    
+    type = "report_submission"
+    digest_label = "reports submitted"
+    count = 1
+    
+    def message(self):
+        if self.status_change:
+            return f"Report {self.title} submitted by {self.partner}"
+        return f"New report submitted by {self.partner}"
+
+
+@dataclass(frozen=True)
+class CommentPosted:
+    recipient: str
+    title: str
+    
+    type = "comment"
+    digest_label = "new comments on tasks"
+    count = 1
+    
+    def message(self):
+        return f"New comment on task: {self.title}"
+
+
+@dataclass(frozen=True)
+class TasksImported:
+    recipient: str
+    title: str
+    count: int
+    
+    type = "task_assignment"
+    digest_label = "tasks assigned to you"
+    
+    def message(self):
+        return f"{self.count} new tasks assigned to you from {self.title}"
+
+
+def build_notifications(events, today):
+    """Collapse a batch of events into one notification, or one digest, per recipient and type
+
+    Events of one type share a digest label and the digest counts what the events
+    stand for, so an import of 100 tasks next to one assignment reads as 101 tasks.
+    """
+    groups = OrderedDict()
+    for event in OrderedDict.fromkeys(events):  # drops exact duplicates, keeps order
+        groups.setdefault((event.recipient, event.type), []).append(event)
+    
+    notifications = []
+    for (recipient, notif_type), group in groups.items():
+        if len(group) == 1:
+            message = group[0].message()
+        else:
+            titles = list(OrderedDict.fromkeys(event.title for event in group))
+            shown = ", ".join(titles[:NOTIFICATION_DIGEST_TITLES])
+            if len(titles) > NOTIFICATION_DIGEST_TITLES:
+                shown += f" and {len(titles) - NOTIFICATION_DIGEST_TITLES} more"
+            message = f"{sum(event.count for event in group)} {group[0].digest_label}: {shown}"
+        notifications.append({
+            "user": recipient,
+            "message": message,
+            "date": today,
+            "read": False,
+            "type": notif_type
+        })
+    return notifications
+
+
+class NotificationQueue:
+    """In-process queue that turns published events into notification writes on a worker thread"""
+
+    def __init__(self, db, batch_window=NOTIFICATION_BATCH_WINDOW, batch_size=NOTIFICATION_BATCH_SIZE):
+        self.db = db
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self._events = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="notification-worker", daemon=True)
+        self._worker.start()
+
+    def publish(self, event):
+        self._events.put(event)
+
+    def flush(self):
+        """Block until every published event has been written"""
+        self._events.join()
+
+    def _next_batch(self):
+        batch = [self._events.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._events.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self.db.insert_notifications(build_notifications(batch, datetime.now().strftime("%Y-%m-%d")))
+            except Exception:
+                logger.exception("Failed to write %d notification events", len(batch))
+            finally:
+                for _ in batch:
+                    self._events.task_done()
@@ -0,0 +1,34 @@
+"""Deferred imports of the heavy data and charting libraries"""
+import importlib
+
+
+class LazyModule:
+    """Module proxy that defers the real import until first attribute access.
+
+    pandas, numpy and the plotly modules dominate cold start but are not needed
+    to render the login page, so they are bound as proxies and loaded on demand.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+px = LazyModule("plotly.express")
+ff = LazyModule("plotly.figure_factory")
+pa = LazyModule("pyarrow")
+pq = LazyModule("pyarrow.parquet")
@@ -0,0 +1,189 @@
+"""Demo project used to seed an empty database"""
+from datetime import datetime, timedelta
+
+from pmt.constants import PARTNERS, TASK_CATEGORIES
+
+
+def create_sample_tasks():
+    today = datetime.now().date()
+    tasks = []
+    
+    # Create a set of tasks for each partner
+    for i, partner in enumerate(PARTNERS):
+        # Past tasks
+        for j in range(3):
+            start_date = today - timedelta(days=90-j*10)
+            end_date = start_date + timedelta(days=15)
+            tasks.append({
+                "title": f"Past Task {j+1} for {partner}",
+                "description": f"A completed task for {partner}",
+                "assigned_to": partner,
+                "assigned_by": "Yildiz Technical University (YTU)" if partner != "Yildiz Technical University (YTU)" else "THE NEW WAY",
+                "category": TASK_CATEGORIES[j % len(TASK_CATEGORIES)],
+                "start_date": start_date.strftime("%Y-%m-%d"),
+                "end_date": end_date.strftime("%Y-%m-%d"),
+                "status": "Completed",
+                "progress": 100,
+                "priority": "High" if j == 0 else "Medium" if j == 1 else "Low",
+                "comments": []
+            })
+        
+        # Current tasks
+        for j in range(2):
+            start_date = today - timedelta(days=15-j*5)
+            end_date = today + timedelta(days=15+j*5)
+            tasks.append({
+                "title": f"Current Task {j+1} for {partner}",
+                "description": f"An ongoing task for {partner}",
+                "assigned_to": partner,
+                "assigned_by": "Yildiz Technical University (YTU)" if partner != "Yildiz Technical University (YTU)" else "THE NEW WAY",
+                "category": TASK_CATEGORIES[(j+3) % len(TASK_CATEGORIES)],
+                "start_date": start_date.strftime("%Y-%m-%d"),
+                "end_date": end_date.strftime("%Y-%m-%d"),
+                "status": "In Progress",
+                "progress": 50 + j*20,
+                "priority": "High" if j == 0 else "Medium",
+                "comments": []
+            })
+        
+        # Future tasks
+        for j in range(3):
+            start_date = today + timedelta(days=30+j*15)
+            end_date = start_date + timedelta(days=20)
+            tasks.append({
+                "title": f"Future Task {j+1} for {partner}",
+                "description": f"A planned task for {partner}",
+                "assigned_to": partner,
+                "assigned_by": "Yildiz Technical University (YTU)" if partner != "Yildiz Technical University (YTU)" else "THE NEW WAY",
+                "category": TASK_CATEGORIES[(j+5) % len(TASK_CATEGORIES)],
+                "start_date": start_date.strftime("%Y-%m-%d"),
+                "end_date": end_date.strftime("%Y-%m-%d"),
+                "status": "Not Started",
+                "progress": 0,
+                "priority": "Medium" if j == 0 else "Low",
+                "comments": []
+            })
+    
+    return tasks
+
+def create_sample_reports():
+    today = datetime.now().date()
+    reports = []
+    
+    for i, partner in enumerate(PARTNERS):
+        for j in range(6):
+            report_date = today - timedelta(days=(6-j)*14)
+            reports.append({
+                "title": f"Biweekly Report {j+1}",
+                "partner": partner,
+                "submission_date": report_date.strftime("%Y-%m-%d"),
+                "period_start": (report_date - timedelta(days=14)).strftime("%Y-%m-%d"),
+                "period_end": report_date.strftime("%Y-%m-%d"),
+                "activities_completed": f"Completed activities for {partner} in period {j+1}",
+                "activities_in_progress": f"Ongoing activities for {partner} in period {j+1}",
+                "activities_planned": f"Planned activities for {partner} in period {j+1}",
+                "issues": f"Issues encountered by {partner} in period {j+1}" if j % 3 == 0 else "",
+                "status": "Submitted" if j < 5 else "Draft" if partner == "Yildiz Technical University (YTU)" else "Pending"
+            })
+    
+    return reports
+
+def create_sample_users():
+    users = [
+        {
+            "username": "admin",
+            "password": "admin123",  # hashed before it is stored
+            "role": "admin",
+            "organization": "Yildiz Technical University (YTU)",
+            "name": "Administrator",
+            "email": "admin@ytu.edu.tr"
+        }
+    ]
+    
+    for partner in PARTNERS:
+        partner_short = partner.split()[0].lower()
+        users.append({
+            "username": partner_short,
+            "password": f"{partner_short}123",  # hashed before it is stored
+            "role": "partner",
+            "organization": partner,
+            "name": f"{partner} Representative",
+            "email": f"contact@{partner_short}.edu"
+        })
+    
+    return users
+
+def create_sample_notifications():
+    today = datetime.now().date()
+    notifications = []
+    
+    # Task assignments
+    for i, partner in enumerate(PARTNERS):
+        notifications.append({
+            "user": partner,
+            "message": f"New task assigned: Current Task 1",
+            "date": (today - timedelta(days=15)).strftime("%Y-%m-%d"),
+            "read": False,
+            "type": "task_assignment"
+        })
+    
+    # Report reminders
+    for i, partner in enumerate(PARTNERS):
+        notifications.append({
+            "user": partner,
+            "message": "Reminder: Biweekly report due tomorrow",
+            "date": (today - timedelta(days=1)).strftime("%Y-%m-%d"),
+            "read": False,
+            "type": "report_reminder"
+        })
+    
+    # Comment notifications
+    for i, partner in enumerate(PARTNERS):
+        if i > 0:  # Skip the first partner
+            notifications.append({
+                "user": partner,
+                "message": f"New comment from {PARTNERS[0]} on Current Task 1",
+                "date": today.strftime("%Y-%m-%d"),
+                "read": False,
+                "type": "comment"
+            })
+    
+    return notifications
+
+def create_sample_documents():
+    documents = []
+    
+    # Project documents
+    documents.append({
+        "title": "TechSight Project Handbook",
+        "category": "Project Management",
+        "upload_date": "2024-01-15",
+        "uploaded_by": "Yildiz Technical University (YTU)",
+        "file_type": "PDF",
+        "shared_with": "All Partners",
+        "description": "Project handbook for the TechSight project"
+    })
+    
+    documents.append({
+        "title": "Financial Guidelines",
+        "category": "Project Management",
+        "upload_date": "2024-01-20",
+        "uploaded_by": "Yildiz Technical University (YTU)",
+        "file_type": "PDF",
+        "shared_with": "All Partners",
+        "description": "Financial guidelines for the TechSight project"
+    })
+    
+    # Partner-specific documents
+    for i, partner in enumerate(PARTNERS):
+        documents.append({
+            "title": f"{partner} - Initial Plan",
+            "category": "Planning",
+            "upload_date": "2024-02-01",
+            "uploaded_by": partner,
+            "file_type": "PDF",
+            "shared_with": ["Yildiz Technical University (YTU)", partner],
+            "description": f"Initial plan for {partner}"
+        })
+    
+    return documents
@@ -0,0 +1,334 @@
+"""Business operations on an explicit store, usable without a Streamlit runtime
+
+Each service takes the Database it works on, the SharedDataset read model over
+it, and the NotificationService its events go to. The app builds one of each
+per process; a test, batch job or worker process can build its own.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from pmt.auth import (
+    LoginThrottle, dummy_password_hash, hash_password, is_password_hash, password_needs_rehash, verify_password
+)
+from pmt.constants import (
+    IMPORT_BATCH_SIZE, NOTIFICATION_RETENTION_DAYS, PARTNERS, REPORT_STATUS, TASK_CATEGORIES, TASK_HISTORY_LIMIT,
+    TASK_STATUS
+)
+from pmt.dataset import SharedDataset
+from pmt.events import CommentPosted, ReportSubmitted, TaskAssigned, TasksImported, build_notifications
+from pmt.lazy import pd
+from pmt.sample_data import (
+    create_sample_documents, create_sample_notifications, create_sample_reports, create_sample_tasks,
+    create_sample_users
+)
+from pmt.tracing import traced
+from pmt.transfer import EXPORT_ENCODERS, validate_task
+
+# Report submissions are announced to the coordinating partner
+COORDINATOR = "Yildiz Technical University (YTU)"
+
+
+def metric_table(store, entity, dimension, values, organization=None):
+    """Partner x value counts read from the counters maintained on every write"""
+    counts = pd.DataFrame(
+        0,
+        index=pd.Index(PARTNERS, name="assigned_to" if entity == "task" else "partner"),
+        columns=pd.Index(values, name=dimension)
+    )
+    for partner, value, count in store.metric_counts(entity, dimension, partner=organization):
+        if partner in counts.index and value in counts.columns:
+            counts.at[partner, value] = count
+    return counts
+
+
+def change_history(store, record_id, limit=TASK_HISTORY_LIMIT):
+    """The latest changes to a task or report, newest first, with who made them and (field, old, new) triples"""
+    entries = store.record_history(record_id, limit=limit + 1)
+    history = []
+    for entry, previous in zip(entries[:limit], entries[1:limit + 1] + [None]):
+        before = previous["data"] if previous is not None else None
+        if entry["op"] == "update" and before is not None:
+            fields = [(field, before.get(field), value) for field, value in entry["data"].items()
+                      if field != "version" and before.get(field) != value]
+            if not fields:
+                continue
+        else:
+            fields = []
+        history.append({
+            "seq": entry["seq"], "at": entry["at"], "actor": entry["actor"], "op": entry["op"], "fields": fields
+        })
+    return history
+
+
+def prepare_database(store, auth):
+    """Seed an empty database with the sample project, or bring an existing one up to date"""
+    if store.is_empty():
+        users = create_sample_users()
+        hashes = auth.hash_passwords([user["password"] for user in users])
+        store.seed(
+            create_sample_tasks(),
+            create_sample_reports(),
+            [{**user, "password": password_hash} for user, password_hash in zip(users, hashes)],
+            create_sample_notifications(),
+            create_sample_documents()
+        )
+    else:
+        auth.migrate_passwords()
+    store.archive_notifications((datetime.now() - timedelta(days=NOTIFICATION_RETENTION_DAYS)).strftime("%Y-%m-%d"))
+
+
+class AuthService:
+    """Password checks with per-username throttling, and password hash upgrades
+
+    With a hasher (an Executor) the KDF runs on its worker threads, so at
+    most that many hashes run at once; without one it runs on the caller's.
+    """
+
+    def __init__(self, store, hasher=None, throttle=None):
+        self.store = store
+        self.hasher = hasher
+        self.throttle = throttle or LoginThrottle()
+
+    def _hash(self, function, *args):
+        if self.hasher is None:
+            return function(*args)
+        return self.hasher.submit(function, *args).result()
+
+    def hash_passwords(self, passwords):
+        return list(self.hasher.map(hash_password, passwords) if self.hasher else map(hash_password, passwords))
+
+    def authenticate(self, username, password):
+        """The user record if the credentials are right; None if they are wrong or the username is locked"""
+        if self.throttle.retry_after(username):
+            return None
+        
+        user = self.store.get_user(username)
+        # Unknown usernames cost a full KDF too, so timing doesn't tell which usernames exist
+        stored = user["password"] if user is not None else dummy_password_hash()
+        if not self._hash(verify_password, password, stored) or user is None:
+            self.throttle.failed(username)
+            return None
+        
+        self.throttle.succeeded(username)
+        if password_needs_rehash(user["password"]):
+            rehash = lambda: self.store.set_password(username, hash_password(password))
+            if self.hasher is None:
+                rehash()
+            else:
+                self.hasher.submit(rehash)
+        return user
+
+    def retry_after(self, username):
+        """Seconds until a locked username may try again, 0 if it may try now"""
+        return self.throttle.retry_after(username)
+
+    def migrate_passwords(self):
+        """Hash the passwords of databases from before hashed passwords"""
+        plaintext = [user for user in self.store.list_users() if not is_password_hash(user["password"])]
+        for user, password_hash in zip(plaintext, self.hash_passwords([u["password"] for u in plaintext])):
+            self.store.set_password(user["username"], password_hash)
+
+
+class NotificationService:
+    """Delivers domain events as notifications and reads a user's inbox
+
+    With a queue (a NotificationQueue) events are written by its worker thread
+    in batches; without one they are written before publish() returns.
+    """
+
+    def __init__(self, store, dataset=None, queue=None):
+        self.store = store
+        self.dataset = dataset or SharedDataset(store)
+        self.queue = queue
+
+    def publish(self, event):
+        if self.queue is not None:
+            self.queue.publish(event)
+        else:
+            self.store.insert_notifications(build_notifications([event], datetime.now().strftime("%Y-%m-%d")))
+
+    def flush(self):
+        """Block until every published event has been written"""
+        if self.queue is not None:
+            self.queue.flush()
+
+    def notifications(self, username, unread_only=False, limit=None):
+        return self.dataset.view(username).notifications(unread_only, limit)
+
+    def unread_count(self, organization):
+        return self.store.unread_count(organization)
+
+    def mark_read(self, organization, notification_ids=None):
+        self.store.mark_notifications_read(organization, notification_ids)
+
+    def archive(self, before_date):
+        return self.store.archive_notifications(before_date)
+
+
+class TaskService:
+    """Task reads scoped to a user, task writes, comments, imports and exports"""
+
+    def __init__(self, store, dataset=None, notifications=None):
+        self.store = store
+        self.dataset = dataset or SharedDataset(store)
+        self.notifications = notifications or NotificationService(store, self.dataset)
+
+    def tasks(self, username, status=None, category=None, partners=None, due_from=None):
+        return self.dataset.view(username).tasks(status, category, partners, due_from)
+
+    def query(self, username, filters=None, sort_by=None, ascending=True):
+        """Filtered and sorted tasks for a user, read a page at a time with TaskQuery.page()"""
+        return self.dataset.view(username).query_tasks(filters, sort_by, ascending)
+
+    def task(self, username, task_id):
+        return self.dataset.view(username).task(task_id)
+
+    def add(self, task_data, actor=None):
+        return self.add_many([task_data], actor=actor)[0]
+
+    def add_many(self, tasks, actor=None):
+        task_ids = self.store.insert_tasks(tasks, actor=actor)
+        for task in tasks:
+            self.notifications.publish(TaskAssigned(task["assigned_to"], task["title"]))
+        return task_ids
+
+    def edit(self, task_id, updated_data, base=None, actor=None):
+        """Save a task as actor; pass base (the task as it was read) to merge with concurrent edits
+
+        Raises EditConflict when another edit changed one of the same fields.
+        """
+        if not self.store.update_task(task_id, updated_data, base=base, actor=actor):
+            return False
+        
+        # Notify if assigned to has changed
+        if "assigned_to" in updated_data:
+            task = self.store.get_task(task_id)
+            self.notifications.publish(TaskAssigned(updated_data["assigned_to"], task["title"], reassigned=True))
+        
+        return True
+
+    def delete(self, task_id, actor=None):
+        return self.store.delete_task(task_id, actor=actor)
+
+    def history(self, task_id, limit=TASK_HISTORY_LIMIT):
+        return change_history(self.store, task_id, limit)
+
+    def comment(self, task_id, organization, text, parent_id=None):
+        if not self.store.add_task_comment(task_id, {
+            "user": organization,
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "text": text
+        }, parent_id=parent_id):
+            return False
+        
+        # Notify the task owner if they are not the commenter
+        task = self.store.get_task(task_id)
+        if task is not None and task["assigned_to"] != organization:
+            self.notifications.publish(CommentPosted(task["assigned_to"], task["title"]))
+        
+        return True
+
+    def import_rows(self, rows, assigned_by, source, actor=None):
+        """Validate every row, then insert IMPORT_BATCH_SIZE tasks per transaction
+
+        Nothing is inserted if any row is invalid. Ids in the file are ignored and
+        each recipient gets one notification for the whole import. Returns the
+        number of imported tasks and a list of (row number, error) pairs.
+        """
+        tasks, errors = [], []
+        for number, row in enumerate(rows, start=1):
+            task, problems = validate_task(row, assigned_by)
+            errors.extend((number, problem) for problem in problems)
+            tasks.append(task)
+        if errors or not tasks:
+            return 0, errors
+        
+        for start in range(0, len(tasks), IMPORT_BATCH_SIZE):
+            self.store.insert_tasks(tasks[start:start + IMPORT_BATCH_SIZE], actor=actor)
+        
+        per_partner = OrderedDict()
+        for task in tasks:
+            per_partner[task["assigned_to"]] = per_partner.get(task["assigned_to"], 0) + 1
+        for partner, count in per_partner.items():
+            self.notifications.publish(TasksImported(partner, source, count))
+        return len(tasks), []
+
+    def export(self, username, kind, fmt):
+        """Encoded chunks of the tasks, reports or comments a user can see, streamed from the database"""
+        scope = self.dataset.view(username).scope()
+        return EXPORT_ENCODERS[fmt](kind, self.store.export_rows(kind, scope=scope))
+
+    def status_counts(self, organization=None):
+        return metric_table(self.store, "task", "status", TASK_STATUS, organization)
+
+    def category_counts(self, organization=None):
+        return metric_table(self.store, "task", "category", TASK_CATEGORIES, organization).sum()
+
+
+class ReportService:
+    """Report reads scoped to a user and report writes"""
+
+    def __init__(self, store, dataset=None, notifications=None):
+        self.store = store
+        self.dataset = dataset or SharedDataset(store)
+        self.notifications = notifications or NotificationService(store, self.dataset)
+
+    def reports(self, username, status=None, partners=None):
+        return self.dataset.view(username).reports(status, partners)
+
+    def add(self, report_data, actor=None):
+        report_id = self.store.insert_report(report_data, actor=actor)
+        
+        # Notify the admin
+        self.notifications.publish(ReportSubmitted(COORDINATOR, report_data["partner"], report_data["title"]))
+        
+        return report_id
+
+    def edit(self, report_id, updated_data, base=None, actor=None):
+        """Save a report as actor; pass base (the report as it was read) to merge with concurrent edits
+
+        Raises EditConflict when another edit changed one of the same fields.
+        """
+        if not self.store.update_report(report_id, updated_data, base=base, actor=actor):
+            return False
+        
+        # Notify if status changed to Submitted
+        if "status" in updated_data and updated_data["status"] == "Submitted":
+            report = self.store.get_report(report_id)
+            self.notifications.publish(ReportSubmitted(
+                COORDINATOR, report["partner"], report["title"], status_change=True
+            ))
+        
+        return True
+
+    def delete(self, report_id, actor=None):
+        return self.store.delete_report(report_id, actor=actor)
+
+    def history(self, report_id, limit=TASK_HISTORY_LIMIT):
+        return change_history(self.store, report_id, limit)
+
+    def status_counts(self, organization=None):
+        return metric_table(self.store, "report", "status", REPORT_STATUS, organization)
+
+
+@traced()
+def compute_dashboard_metrics(tasks, reports, organization=None):
+    """Dashboard numbers from the materialized counters; the cost doesn't grow with the data"""
+    task_counts = tasks.status_counts(organization)
+    report_counts = reports.status_counts(organization)
+    
+    tasks_by_status = task_counts.sum()
+    total_tasks = int(tasks_by_status.sum())
+    total_reports = int(report_counts.to_numpy().sum())
+    submitted_reports = int(report_counts["Submitted"].sum())
+    
+    return {
+        "total_tasks": total_tasks,
+        "completion_rate": (int(tasks_by_status["Completed"]) / total_tasks * 100) if total_tasks > 0 else 0,
+        "in_progress": int(tasks_by_status["In Progress"]),
+        "total_reports": total_reports,
+        "report_rate": (submitted_reports / total_reports * 100) if total_reports > 0 else 0,
+        "task_status_counts": task_counts,
+        "report_status_counts": report_counts,
+        "category_counts": tasks.category_counts(organization)
+    }
@@ -0,0 +1,978 @@
+"""SQLite storage: schema, connections and every query the app runs"""
+import json
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from pmt.constants import (
+    EXPORT_CHUNK_SIZE, ID_WIDTH, NOTIFICATION_ARCHIVE_BATCH, NOTIFICATION_INBOX_LIMIT, SEARCH_MARKS,
+    SEARCH_MIN_PREFIX, SEARCH_RESULT_LIMIT, SEARCH_SNIPPET_TOKENS
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS id_sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0);
+-- Tells files derived from this database (task snapshots) apart from those of another one
+INSERT OR IGNORE INTO meta (key, value) VALUES ('database_id', abs(random()));
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    assigned_to TEXT NOT NULL,
+    assigned_by TEXT NOT NULL DEFAULT '',
+    category TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    priority TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_assigned_to ON tasks(assigned_to, status);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+CREATE INDEX IF NOT EXISTS idx_tasks_category ON tasks(category);
+CREATE INDEX IF NOT EXISTS idx_tasks_end_date ON tasks(end_date);
+
+-- Comment ids only grow, so ordering a task's comments by id orders them by
+-- time; replies point at the top-level comment of their thread
+CREATE TABLE IF NOT EXISTS task_comments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    user TEXT NOT NULL,
+    date TEXT NOT NULL,
+    text TEXT NOT NULL,
+    parent_id INTEGER REFERENCES task_comments(id) ON DELETE CASCADE
+);
+DROP INDEX IF EXISTS idx_task_comments_task_id;
+CREATE INDEX IF NOT EXISTS idx_task_comments_thread ON task_comments(task_id, parent_id);
+CREATE INDEX IF NOT EXISTS idx_task_comments_parent ON task_comments(parent_id);
+
+-- Inverted index over comment text, kept in step by the triggers below
+CREATE VIRTUAL TABLE IF NOT EXISTS task_comments_fts USING fts5(
+    text, content='task_comments', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS task_comments_fts_insert AFTER INSERT ON task_comments BEGIN
+    INSERT INTO task_comments_fts (rowid, text) VALUES (NEW.id, NEW.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS task_comments_fts_delete AFTER DELETE ON task_comments BEGIN
+    INSERT INTO task_comments_fts (task_comments_fts, rowid, text) VALUES ('delete', OLD.id, OLD.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS task_comments_fts_update AFTER UPDATE OF text ON task_comments BEGIN
+    INSERT INTO task_comments_fts (task_comments_fts, rowid, text) VALUES ('delete', OLD.id, OLD.text);
+    INSERT INTO task_comments_fts (rowid, text) VALUES (NEW.id, NEW.text);
+END;
+
+CREATE TABLE IF NOT EXISTS reports (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    partner TEXT NOT NULL,
+    submission_date TEXT NOT NULL,
+    period_start TEXT NOT NULL,
+    period_end TEXT NOT NULL,
+    activities_completed TEXT NOT NULL DEFAULT '',
+    activities_in_progress TEXT NOT NULL DEFAULT '',
+    activities_planned TEXT NOT NULL DEFAULT '',
+    issues TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_reports_partner ON reports(partner, status);
+CREATE INDEX IF NOT EXISTS idx_reports_status ON reports(status);
+CREATE INDEX IF NOT EXISTS idx_reports_submission_date ON reports(submission_date);
+CREATE INDEX IF NOT EXISTS idx_reports_partner_submission_date ON reports(partner, submission_date);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    message TEXT NOT NULL,
+    date TEXT NOT NULL,
+    read INTEGER NOT NULL DEFAULT 0,
+    type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user, read, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_date ON notifications(date);
+
+CREATE TABLE IF NOT EXISTS notification_inbox (
+    user TEXT PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0,
+    unread INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS notifications_archive (
+    id TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    message TEXT NOT NULL,
+    date TEXT NOT NULL,
+    read INTEGER NOT NULL DEFAULT 0,
+    type TEXT NOT NULL,
+    archived_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_archive_user ON notifications_archive(user);
+
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL,
+    organization TEXT NOT NULL,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    category TEXT NOT NULL,
+    upload_date TEXT NOT NULL,
+    uploaded_by TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    shared_with TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT ''
+);
+
+-- Dashboard counters per partner, kept current by the triggers below in the
+-- same transaction as every task/report write
+CREATE TABLE IF NOT EXISTS metric_counts (
+    entity TEXT NOT NULL,
+    partner TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (entity, partner, dimension, value)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS tasks_metrics_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO metric_counts VALUES ('task', NEW.assigned_to, 'status', NEW.status, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+    INSERT INTO metric_counts VALUES ('task', NEW.assigned_to, 'category', NEW.category, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_metrics_delete AFTER DELETE ON tasks BEGIN
+    UPDATE metric_counts SET count = count - 1
+        WHERE entity = 'task' AND partner = OLD.assigned_to AND dimension = 'status' AND value = OLD.status;
+    UPDATE metric_counts SET count = count - 1
+        WHERE entity = 'task' AND partner = OLD.assigned_to AND dimension = 'category' AND value = OLD.category;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_metrics_update AFTER UPDATE OF assigned_to, status, category ON tasks BEGIN
+    UPDATE metric_counts SET count = count - 1
+        WHERE entity = 'task' AND partner = OLD.assigned_to AND dimension = 'status' AND value = OLD.status;
+    INSERT INTO metric_counts VALUES ('task', NEW.assigned_to, 'status', NEW.status, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+    UPDATE metric_counts SET count = count - 1
+        WHERE entity = 'task' AND partner = OLD.assigned_to AND dimension = 'category' AND value = OLD.category;
+    INSERT INTO metric_counts VALUES ('task', NEW.assigned_to, 'category', NEW.category, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS reports_metrics_insert AFTER INSERT ON reports BEGIN
+    INSERT INTO metric_counts VALUES ('report', NEW.partner, 'status', NEW.status, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS reports_metrics_delete AFTER DELETE ON reports BEGIN
+    UPDATE metric_counts SET count = count - 1
+        WHERE entity = 'report' AND partner = OLD.partner AND dimension = 'status' AND value = OLD.status;
+END;
+
+CREATE TRIGGER IF NOT EXISTS reports_metrics_update AFTER UPDATE OF partner, status ON reports BEGIN
+    UPDATE metric_counts SET count = count - 1
+        WHERE entity = 'report' AND partner = OLD.partner AND dimension = 'status' AND value = OLD.status;
+    INSERT INTO metric_counts VALUES ('report', NEW.partner, 'status', NEW.status, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+END;
+
+-- Full-text indexes for the Search page. The FTS rowid is the sequence number
+-- of the record id ("task_0000000042" -> 42), which, unlike the implicit rowid
+-- of these tables, never changes; ref holds the id itself for joining back.
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(ref UNINDEXED, title, description, prefix='3 4');
+
+CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_fts (rowid, ref, title, description)
+        VALUES (CAST(substr(NEW.id, instr(NEW.id, '_') + 1) AS INTEGER), NEW.id, NEW.title, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+    DELETE FROM tasks_fts WHERE rowid = CAST(substr(OLD.id, instr(OLD.id, '_') + 1) AS INTEGER);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+    UPDATE tasks_fts SET title = NEW.title, description = NEW.description
+        WHERE rowid = CAST(substr(OLD.id, instr(OLD.id, '_') + 1) AS INTEGER);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+    ref UNINDEXED, title, activities_completed, activities_in_progress, activities_planned, issues, prefix='3 4'
+);
+
+CREATE TRIGGER IF NOT EXISTS reports_fts_insert AFTER INSERT ON reports BEGIN
+    INSERT INTO reports_fts (rowid, ref, title, activities_completed, activities_in_progress,
+                             activities_planned, issues)
+        VALUES (CAST(substr(NEW.id, instr(NEW.id, '_') + 1) AS INTEGER), NEW.id, NEW.title,
+                NEW.activities_completed, NEW.activities_in_progress, NEW.activities_planned, NEW.issues);
+END;
+
+CREATE TRIGGER IF NOT EXISTS reports_fts_delete AFTER DELETE ON reports BEGIN
+    DELETE FROM reports_fts WHERE rowid = CAST(substr(OLD.id, instr(OLD.id, '_') + 1) AS INTEGER);
+END;
+
+CREATE TRIGGER IF NOT EXISTS reports_fts_update
+    AFTER UPDATE OF title, activities_completed, activities_in_progress, activities_planned, issues ON reports BEGIN
+    UPDATE reports_fts SET title = NEW.title,
+        activities_completed = NEW.activities_completed, activities_in_progress = NEW.activities_in_progress,
+        activities_planned = NEW.activities_planned, issues = NEW.issues
+        WHERE rowid = CAST(substr(OLD.id, instr(OLD.id, '_') + 1) AS INTEGER);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(ref UNINDEXED, title, description, prefix='3 4');
+
+CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, ref, title, description)
+        VALUES (CAST(substr(NEW.id, instr(NEW.id, '_') + 1) AS INTEGER), NEW.id, NEW.title, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+    DELETE FROM documents_fts WHERE rowid = CAST(substr(OLD.id, instr(OLD.id, '_') + 1) AS INTEGER);
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE OF title, description ON documents BEGIN
+    UPDATE documents_fts SET title = NEW.title, description = NEW.description
+        WHERE rowid = CAST(substr(OLD.id, instr(OLD.id, '_') + 1) AS INTEGER);
+END;
+"""
+
+TASK_FIELDS = ("id", "title", "description", "assigned_to", "assigned_by", "category",
+               "start_date", "end_date", "status", "progress", "priority")
+REPORT_FIELDS = ("id", "title", "partner", "submission_date", "period_start", "period_end",
+                 "activities_completed", "activities_in_progress", "activities_planned",
+                 "issues", "status")
+NOTIFICATION_FIELDS = ("id", "user", "message", "date", "read", "type")
+USER_FIELDS = ("username", "password", "role", "organization", "name", "email")
+# Free-text columns indexed for the Search page; the first one is the title
+SEARCH_COLUMNS = {
+    "tasks": ("title", "description"),
+    "reports": ("title", "activities_completed", "activities_in_progress", "activities_planned", "issues"),
+    "documents": ("title", "description")
+}
+COMMENT_FIELDS = ("id", "task_id", "user", "date", "text", "parent_id")
+DOCUMENT_FIELDS = ("id", "title", "category", "upload_date", "uploaded_by", "file_type",
+                   "shared_with", "description")
+
+# Tables whose ids are numbered by each id_sequences entry
+ID_SEQUENCE_TABLES = {
+    "task": ("tasks",),
+    "report": ("reports",),
+    "notif": ("notifications", "notifications_archive"),
+    "doc": ("documents",)
+}
+
+# Entities whose every insert, update and delete is appended to the change log
+LOGGED_TABLES = {"task": ("tasks", TASK_FIELDS), "report": ("reports", REPORT_FIELDS)}
+
+
+def _record_json(fields, alias):
+    pairs = ", ".join(f"'{field}', {alias}.{field}" for field in fields + ("version",))
+    return f"json_object({pairs})"
+
+
+# Append-only change log, written by triggers in the same transaction as the
+# change itself. Each entry holds the whole record after the change (NULL for
+# a delete), so replaying the log from any point gives the current state, and
+# the user the change was made by, which the store puts in change_actor at the
+# start of every logged write.
+CHANGE_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY,
+    entity TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    op TEXT NOT NULL,
+    at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+    data TEXT,
+    actor TEXT
+);
+
+CREATE TABLE IF NOT EXISTS change_actor (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    actor TEXT
+);
+INSERT OR IGNORE INTO change_actor (id, actor) VALUES (1, NULL);
+CREATE INDEX IF NOT EXISTS idx_changes_record ON changes(record_id, seq);
+
+CREATE TRIGGER IF NOT EXISTS changes_no_update BEFORE UPDATE ON changes BEGIN
+    SELECT RAISE(ABORT, 'the change log is append-only');
+END;
+
+CREATE TRIGGER IF NOT EXISTS changes_no_delete BEFORE DELETE ON changes BEGIN
+    SELECT RAISE(ABORT, 'the change log is append-only');
+END;
+""" + "".join(f"""
+CREATE TRIGGER IF NOT EXISTS {table}_log_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO changes (entity, record_id, op, data, actor)
+        VALUES ('{entity}', NEW.id, 'insert', {_record_json(fields, 'NEW')}, (SELECT actor FROM change_actor));
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_log_update AFTER UPDATE ON {table} BEGIN
+    INSERT INTO changes (entity, record_id, op, data, actor)
+        VALUES ('{entity}', NEW.id, 'update', {_record_json(fields, 'NEW')}, (SELECT actor FROM change_actor));
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_log_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO changes (entity, record_id, op, data, actor)
+        VALUES ('{entity}', OLD.id, 'delete', NULL, (SELECT actor FROM change_actor));
+END;
+""" for entity, (table, fields) in LOGGED_TABLES.items())
+
+
+class EditConflict(Exception):
+    """Raised when a field was changed by someone else since the editor read the record"""
+
+    def __init__(self, record_id, fields, current):
+        super().__init__(f"Record {record_id} was changed by someone else: {', '.join(fields)}")
+        self.record_id = record_id
+        self.fields = fields
+        self.current = current
+
+
+class Database:
+    """SQLite-backed repository shared by every session of the app"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        if "task_comments" in existing:
+            # Databases from before comment threads
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(task_comments)")}
+            if "parent_id" not in columns:
+                conn.execute("ALTER TABLE task_comments ADD COLUMN parent_id INTEGER "
+                             "REFERENCES task_comments(id) ON DELETE CASCADE")
+        for table in ("tasks", "reports"):
+            # Databases from before versioned records
+            if table in existing:
+                columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if "version" not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        if "changes" in existing:
+            # Change logs from before entries recorded who made the change
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(changes)")}
+            if "actor" not in columns:
+                conn.execute("ALTER TABLE changes ADD COLUMN actor TEXT")
+                for table, _ in LOGGED_TABLES.values():
+                    for op in ("insert", "update", "delete"):
+                        conn.execute(f"DROP TRIGGER IF EXISTS {table}_log_{op}")
+        padded = "meta" in existing and conn.execute(
+            "SELECT 1 FROM meta WHERE key = 'ids_padded'"
+        ).fetchone() is not None
+        if not padded:
+            self._pad_legacy_ids(existing)
+        conn.executescript(SCHEMA + CHANGE_LOG_SCHEMA)
+        with self._transaction() as conn:
+            if not padded:
+                # Carry on numbering after the highest id in use, then never look again
+                for prefix, tables in ID_SEQUENCE_TABLES.items():
+                    used = " UNION ALL ".join(
+                        f"SELECT MAX(CAST(substr(id, instr(id, '_') + 1) AS INTEGER)) AS value FROM {table}"
+                        for table in tables
+                    )
+                    conn.execute(
+                        f"INSERT INTO id_sequences (name, value) SELECT ?, COALESCE(MAX(value), 0) FROM ({used}) "
+                        "WHERE true ON CONFLICT(name) DO UPDATE SET value = max(value, excluded.value)",
+                        (prefix,)
+                    )
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('ids_padded', 1)")
+            if "changes" not in existing:
+                # Start the log of an existing database with the records it already holds
+                for entity, (table, fields) in LOGGED_TABLES.items():
+                    conn.execute(
+                        f"INSERT INTO changes (entity, record_id, op, data) "
+                        f"SELECT '{entity}', id, 'insert', {_record_json(fields, table)} FROM {table} ORDER BY id"
+                    )
+            self._rebuild_inbox(conn)
+            if conn.execute("SELECT 1 FROM metric_counts LIMIT 1").fetchone() is None:
+                self._rebuild_metrics(conn)
+            if "task_comments_fts" not in existing:
+                conn.execute("INSERT INTO task_comments_fts (task_comments_fts) VALUES ('rebuild')")
+            for table, columns in SEARCH_COLUMNS.items():
+                if f"{table}_fts" not in existing:
+                    conn.execute(
+                        f"INSERT INTO {table}_fts (rowid, ref, {', '.join(columns)}) "
+                        f"SELECT CAST(substr(id, instr(id, '_') + 1) AS INTEGER), id, {', '.join(columns)} FROM {table}"
+                    )
+
+    def _pad_legacy_ids(self, existing):
+        """Rename ids from before id sequences ("task_56") to the padded form ("task_0000000056")
+
+        Padded ids sort in creation order. The number stays the same, so the
+        search index rowids still match. The triggers on the renamed tables
+        are dropped for the rename and recreated by SCHEMA straight after.
+        A new database id makes task snapshots of the old ids unusable.
+        """
+        def padded(prefix, column):
+            return f"'{prefix}_' || printf('%0{ID_WIDTH}d', CAST(substr({column}, instr({column}, '_') + 1) AS INTEGER))"
+        
+        renames = [(prefix, table) for prefix, tables in ID_SEQUENCE_TABLES.items() for table in tables
+                   if table in existing]
+        with self._transaction() as conn:
+            legacy = [(prefix, table) for prefix, table in renames if conn.execute(
+                f"SELECT 1 FROM {table} WHERE id != {padded(prefix, 'id')} LIMIT 1"
+            ).fetchone() is not None]
+            if not legacy:
+                return
+            
+            conn.execute("PRAGMA defer_foreign_keys = ON")
+            for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN "
+                f"({', '.join('?' * (len(legacy) + 1))})", [table for _, table in legacy] + ["changes"]
+            ).fetchall():
+                conn.execute(f"DROP TRIGGER {name}")
+            for prefix, table in legacy:
+                conn.execute(f"UPDATE {table} SET id = {padded(prefix, 'id')} WHERE id != {padded(prefix, 'id')}")
+                if f"{table}_fts" in existing:
+                    conn.execute(f"UPDATE {table}_fts SET ref = {padded(prefix, 'ref')} WHERE ref != {padded(prefix, 'ref')}")
+                if table == "tasks" and "task_comments" in existing:
+                    conn.execute(f"UPDATE task_comments SET task_id = {padded(prefix, 'task_id')} "
+                                 f"WHERE task_id != {padded(prefix, 'task_id')}")
+                if "changes" in existing:
+                    conn.execute(
+                        f"UPDATE changes SET record_id = {padded(prefix, 'record_id')}, "
+                        f"data = CASE WHEN data IS NULL THEN NULL ELSE json_set(data, '$.id', {padded(prefix, 'record_id')}) END "
+                        f"WHERE record_id LIKE '{prefix}\\_%' ESCAPE '\\' AND record_id != {padded(prefix, 'record_id')}"
+                    )
+            if "meta" in existing:
+                conn.execute("UPDATE meta SET value = abs(random()) WHERE key = 'database_id'")
+
+    def _connection(self):
+        # Streamlit runs each session in its own thread, so every thread
+        # gets its own connection to the shared database file.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    @contextmanager
+    def _logged_transaction(self, actor=None):
+        """Write transaction whose task and report changes are logged as made by actor"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE change_actor SET actor = ?", (actor,))
+            yield conn
+
+    def _query(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+    @staticmethod
+    def _where(alias="", **filters):
+        # Each filter is either a single value or a collection of accepted
+        # values; None means "don't filter", so the indexes on these columns
+        # only ever visit matching rows.
+        clauses, params = [], []
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set, frozenset)):
+                if not value:
+                    return " WHERE 0", []
+                clauses.append(f"{alias}{column} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"{alias}{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @staticmethod
+    def _next_ids(conn, prefix, count):
+        # Called inside the caller's write transaction, so concurrent writers
+        # are serialized by SQLite and a number is never handed out twice,
+        # even after the record that used it has been deleted.
+        last = conn.execute(
+            "INSERT INTO id_sequences (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value RETURNING value",
+            (prefix, count)
+        ).fetchone()[0]
+        return [f"{prefix}_{value:0{ID_WIDTH}d}" for value in range(last - count + 1, last + 1)]
+
+    @classmethod
+    def _next_id(cls, conn, prefix):
+        return cls._next_ids(conn, prefix, 1)[0]
+
+    @staticmethod
+    def _bump_version(conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+
+    def data_version(self):
+        """Counter bumped by every task, comment and report write"""
+        return self._query("SELECT value FROM meta WHERE key = 'data_version'")[0][0]
+
+    def database_id(self):
+        return self._query("SELECT value FROM meta WHERE key = 'database_id'")[0][0]
+
+    @staticmethod
+    def _insert(conn, table, fields, record):
+        columns = [f for f in fields if f in record]
+        conn.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [record[c] for c in columns]
+        )
+
+    @staticmethod
+    def _update(conn, table, key, fields, record_id, updated_data):
+        columns = [f for f in updated_data if f in fields and f != key]
+        if not columns:
+            return conn.execute(f"SELECT 1 FROM {table} WHERE {key} = ?", (record_id,)).fetchone() is not None
+        cursor = conn.execute(
+            f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)}, version = version + 1 WHERE {key} = ?",
+            [updated_data[c] for c in columns] + [record_id]
+        )
+        return cursor.rowcount > 0
+
+    @classmethod
+    def _merge_update(cls, conn, table, fields, record_id, updated_data, base):
+        """Compare-and-swap update of the fields the editor changed from base
+
+        base is the record as the editor read it, version included. If someone
+        else has saved since, their changes to other fields are kept; a field
+        both sides changed to different values raises EditConflict.
+        """
+        row = conn.execute(f"SELECT * FROM {table} WHERE id = ?", (record_id,)).fetchone()
+        if row is None:
+            return False
+        current = dict(row)
+        changes = {f: v for f, v in updated_data.items() if f in fields and f != "id" and v != base.get(f)}
+        if current["version"] != base["version"]:
+            conflicts = [f for f, v in changes.items() if current[f] != base.get(f) and current[f] != v]
+            if conflicts:
+                raise EditConflict(record_id, conflicts, current)
+            changes = {f: v for f, v in changes.items() if current[f] != v}
+        if not changes:
+            return True
+        cursor = conn.execute(
+            f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in changes)}, version = version + 1 "
+            "WHERE id = ? AND version = ?",
+            list(changes.values()) + [record_id, current["version"]]
+        )
+        return cursor.rowcount > 0
+
+    def is_empty(self):
+        return self._query("SELECT COUNT(*) FROM users")[0][0] == 0
+
+    def seed(self, tasks, reports, users, notifications, documents):
+        with self._logged_transaction() as conn:
+            for task in tasks:
+                task_id = self._next_id(conn, "task")
+                self._insert(conn, "tasks", TASK_FIELDS, {**task, "id": task_id})
+                for comment in task.get("comments", []):
+                    conn.execute(
+                        "INSERT INTO task_comments (task_id, user, date, text) VALUES (?, ?, ?, ?)",
+                        (task_id, comment["user"], comment["date"], comment["text"])
+                    )
+            for report in reports:
+                self._insert(conn, "reports", REPORT_FIELDS, {**report, "id": self._next_id(conn, "report")})
+            for user in users:
+                self._insert(conn, "users", USER_FIELDS, user)
+            for notif in notifications:
+                self._insert(conn, "notifications", NOTIFICATION_FIELDS, {**notif, "id": self._next_id(conn, "notif")})
+            self._rebuild_inbox(conn)
+            for doc in documents:
+                self._insert(conn, "documents", DOCUMENT_FIELDS, {
+                    **doc,
+                    "id": self._next_id(conn, "doc"),
+                    "shared_with": json.dumps(doc["shared_with"])
+                })
+
+    # Change log
+    def change_head(self):
+        """Sequence number of the newest change log entry, 0 for an empty log"""
+        return self._query("SELECT COALESCE(MAX(seq), 0) FROM changes")[0][0]
+
+    @staticmethod
+    def _change(row):
+        change = dict(row)
+        change["data"] = json.loads(change["data"]) if change["data"] is not None else None
+        return change
+
+    def changes_since(self, seq, entity=None, limit=None):
+        """Log entries after seq, oldest first; a client that has applied up to seq syncs with these"""
+        where, params = "seq > ?", [seq]
+        if entity is not None:
+            where += " AND entity = ?"
+            params.append(entity)
+        sql = f"SELECT * FROM changes WHERE {where} ORDER BY seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._change(row) for row in self._query(sql, params)]
+
+    def record_history(self, record_id, limit=None):
+        """Log entries of one task or report, newest first"""
+        sql, params = "SELECT * FROM changes WHERE record_id = ? ORDER BY seq DESC", [record_id]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._change(row) for row in self._query(sql, params)]
+
+    # Tasks
+    def task_table(self, columns, assigned_to=None):
+        where, params = self._where(assigned_to=assigned_to)
+        return self._query(f"SELECT {', '.join(columns)} FROM tasks{where} ORDER BY id", params)
+
+    def get_task(self, task_id):
+        rows = self._query("SELECT * FROM tasks WHERE id = ?", (task_id,))
+        return dict(rows[0]) if rows else None
+
+    def insert_tasks(self, tasks, actor=None):
+        """Insert a batch of tasks in one transaction and return their new ids"""
+        columns = TASK_FIELDS[1:]
+        with self._logged_transaction(actor) as conn:
+            task_ids = self._next_ids(conn, "task", len(tasks))
+            conn.executemany(
+                f"INSERT INTO tasks ({', '.join(TASK_FIELDS)}) VALUES ({', '.join('?' * len(TASK_FIELDS))})",
+                ([task_id] + [task[c] for c in columns] for task_id, task in zip(task_ids, tasks))
+            )
+            self._bump_version(conn)
+        return task_ids
+
+    def update_task(self, task_id, updated_data, base=None, actor=None):
+        """Update a task; with base (the task as the editor read it) only the edited fields are merged in"""
+        with self._logged_transaction(actor) as conn:
+            self._bump_version(conn)
+            if base is None:
+                return self._update(conn, "tasks", "id", TASK_FIELDS, task_id, updated_data)
+            return self._merge_update(conn, "tasks", TASK_FIELDS, task_id, updated_data, base)
+
+    def delete_task(self, task_id, actor=None):
+        with self._logged_transaction(actor) as conn:
+            self._bump_version(conn)
+            return conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,)).rowcount > 0
+
+    def add_task_comment(self, task_id, comment, parent_id=None):
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM tasks WHERE id = ?", (task_id,)).fetchone() is None:
+                return False
+            if parent_id is not None:
+                # Replies attach to the top-level comment of the thread, on the same task
+                parent = conn.execute(
+                    "SELECT COALESCE(parent_id, id) FROM task_comments WHERE id = ? AND task_id = ?",
+                    (parent_id, task_id)
+                ).fetchone()
+                if parent is None:
+                    return False
+                parent_id = parent[0]
+            conn.execute(
+                "INSERT INTO task_comments (task_id, user, date, text, parent_id) VALUES (?, ?, ?, ?, ?)",
+                (task_id, comment["user"], comment["date"], comment["text"], parent_id)
+            )
+            self._bump_version(conn)
+        return True
+
+    # Comments
+    def count_comment_threads(self, task_id):
+        return self._query(
+            "SELECT COUNT(*) FROM task_comments WHERE task_id = ? AND parent_id IS NULL", (task_id,)
+        )[0][0]
+
+    def list_comment_threads(self, task_id, limit, offset=0):
+        """The newest top-level comments of a task with their replies (oldest first)
+
+        Only the requested page of the discussion is read, via the (task_id, parent_id) index.
+        """
+        threads = [{**dict(row), "replies": []} for row in self._query(
+            "SELECT * FROM task_comments WHERE task_id = ? AND parent_id IS NULL ORDER BY id DESC LIMIT ? OFFSET ?",
+            (task_id, limit, offset)
+        )]
+        if threads:
+            by_id = {thread["id"]: thread for thread in threads}
+            for row in self._query(
+                f"SELECT * FROM task_comments WHERE parent_id IN ({', '.join('?' * len(by_id))}) ORDER BY id",
+                list(by_id)
+            ):
+                by_id[row["parent_id"]]["replies"].append(dict(row))
+        return threads
+
+    @staticmethod
+    def _match_expression(text):
+        # Free text becomes an AND of quoted terms, so user input can never be
+        # parsed as FTS5 query syntax. The last word also matches longer words
+        # (search as you type) once it is long enough to be selective.
+        terms = re.findall(r"\w+", text)
+        expression = [f'"{term}"' for term in terms]
+        if terms and len(terms[-1]) >= SEARCH_MIN_PREFIX:
+            expression[-1] += "*"
+        return " ".join(expression)
+
+    def _comment_search(self, text, assigned_to):
+        where, params = self._where("t.", assigned_to=assigned_to)
+        where += (" AND " if where else " WHERE ") + "task_comments_fts MATCH ?"
+        sql = ("FROM task_comments_fts f JOIN task_comments c ON c.id = f.rowid "
+               f"JOIN tasks t ON t.id = c.task_id{where}")
+        return sql, params + [self._match_expression(text)]
+
+    def count_comment_matches(self, text, assigned_to=None):
+        if not self._match_expression(text):
+            return 0
+        sql, params = self._comment_search(text, assigned_to)
+        return self._query(f"SELECT COUNT(*) {sql}", params)[0][0]
+
+    def search_comments(self, text, assigned_to=None, limit=20, offset=0):
+        """Comments containing every word of text, newest first"""
+        if not self._match_expression(text):
+            return []
+        sql, params = self._comment_search(text, assigned_to)
+        return [dict(row) for row in self._query(
+            f"SELECT c.*, t.title AS task_title {sql} ORDER BY c.id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        )]
+
+    # Reports
+    def list_reports(self, partner=None, status=None):
+        where, params = self._where(partner=partner, status=status)
+        return [dict(row) for row in self._query(f"SELECT * FROM reports{where} ORDER BY id", params)]
+
+    def recent_reports(self, partner=None, limit=5):
+        """Newest reports first, read off the submission_date indexes without sorting the table"""
+        where, params = self._where(partner=partner)
+        return [dict(row) for row in self._query(
+            f"SELECT * FROM reports{where} ORDER BY submission_date DESC, id LIMIT ?", params + [limit]
+        )]
+
+    def get_report(self, report_id):
+        rows = self._query("SELECT * FROM reports WHERE id = ?", (report_id,))
+        return dict(rows[0]) if rows else None
+
+    def insert_report(self, report_data, actor=None):
+        with self._logged_transaction(actor) as conn:
+            report_id = self._next_id(conn, "report")
+            self._insert(conn, "reports", REPORT_FIELDS, {**report_data, "id": report_id})
+            self._bump_version(conn)
+        return report_id
+
+    def update_report(self, report_id, updated_data, base=None, actor=None):
+        """Update a report; with base (the report as the editor read it) only the edited fields are merged in"""
+        with self._logged_transaction(actor) as conn:
+            self._bump_version(conn)
+            if base is None:
+                return self._update(conn, "reports", "id", REPORT_FIELDS, report_id, updated_data)
+            return self._merge_update(conn, "reports", REPORT_FIELDS, report_id, updated_data, base)
+
+    def delete_report(self, report_id, actor=None):
+        with self._logged_transaction(actor) as conn:
+            self._bump_version(conn)
+            return conn.execute("DELETE FROM reports WHERE id = ?", (report_id,)).rowcount > 0
+
+    # Dashboard metrics
+    @staticmethod
+    def _rebuild_metrics(conn):
+        # Only needed for databases created before the counters existed;
+        # afterwards the triggers keep them in step with every write.
+        conn.execute("DELETE FROM metric_counts")
+        for entity, table, partner, dimension in (("task", "tasks", "assigned_to", "status"),
+                                                  ("task", "tasks", "assigned_to", "category"),
+                                                  ("report", "reports", "partner", "status")):
+            conn.execute(
+                "INSERT INTO metric_counts (entity, partner, dimension, value, count) "
+                f"SELECT '{entity}', {partner}, '{dimension}', {dimension}, COUNT(*) "
+                f"FROM {table} GROUP BY {partner}, {dimension}"
+            )
+
+    def metric_counts(self, entity, dimension, partner=None):
+        """(partner, value, count) rows for one counter; the size depends on partners, not on data"""
+        where, params = self._where(entity=entity, dimension=dimension, partner=partner)
+        return self._query(f"SELECT partner, value, count FROM metric_counts{where}", params)
+
+    # Export
+    def export_rows(self, kind, scope=None, chunk_size=EXPORT_CHUNK_SIZE):
+        """Rows of tasks, reports or comments (limited to the scope's partners), chunk_size at a time"""
+        if kind == "comments":
+            where, params = self._where("t.", assigned_to=scope)
+            sql = (f"SELECT {', '.join('c.' + f for f in COMMENT_FIELDS)} "
+                   f"FROM task_comments c JOIN tasks t ON t.id = c.task_id{where} ORDER BY c.id")
+        elif kind == "reports":
+            where, params = self._where(partner=scope)
+            sql = f"SELECT {', '.join(REPORT_FIELDS)} FROM reports{where} ORDER BY id"
+        else:
+            where, params = self._where(assigned_to=scope)
+            sql = f"SELECT {', '.join(TASK_FIELDS)} FROM tasks{where} ORDER BY id"
+        
+        # A separate cursor, so the export can be read while other queries run
+        cursor = self._connection().cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    # Notifications
+    @staticmethod
+    def _rebuild_inbox(conn):
+        conn.execute("DELETE FROM notification_inbox")
+        conn.execute(
+            "INSERT INTO notification_inbox (user, total, unread) "
+            "SELECT user, COUNT(*), SUM(read = 0) FROM notifications GROUP BY user"
+        )
+
+    @staticmethod
+    def _adjust_inbox(conn, user, total, unread):
+        conn.execute(
+            "INSERT INTO notification_inbox (user, total, unread) VALUES (?, ?, ?) "
+            "ON CONFLICT(user) DO UPDATE SET total = total + excluded.total, unread = unread + excluded.unread",
+            (user, total, unread)
+        )
+
+    def list_notifications(self, user, unread_only=False, limit=None):
+        sql = "SELECT * FROM notifications WHERE user = ?"
+        if unread_only:
+            sql += " AND read = 0"
+        sql += " ORDER BY id DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = self._query(sql, (user,))
+        return [{**dict(row), "read": bool(row["read"])} for row in reversed(rows)]
+
+    def unread_count(self, user):
+        rows = self._query("SELECT unread FROM notification_inbox WHERE user = ?", (user,))
+        return rows[0][0] if rows else 0
+
+    def insert_notifications(self, notifications):
+        notif_ids = []
+        with self._transaction() as conn:
+            for notification in notifications:
+                notif_id = self._next_id(conn, "notif")
+                self._insert(conn, "notifications", NOTIFICATION_FIELDS, {**notification, "id": notif_id})
+                self._adjust_inbox(conn, notification["user"], 1, 0 if notification.get("read") else 1)
+                notif_ids.append(notif_id)
+            
+            for user in {notification["user"] for notification in notifications}:
+                total = conn.execute("SELECT total FROM notification_inbox WHERE user = ?", (user,)).fetchone()[0]
+                # Archive in batches so the overflow query doesn't run on every insert
+                if total >= NOTIFICATION_INBOX_LIMIT + NOTIFICATION_ARCHIVE_BATCH:
+                    self._archive(conn, "user = ? AND id NOT IN (SELECT id FROM notifications WHERE user = ? "
+                                  "ORDER BY id DESC LIMIT ?)",
+                                  (user, user, NOTIFICATION_INBOX_LIMIT))
+        return notif_ids
+
+    def mark_notifications_read(self, user, notification_ids=None):
+        """Mark all (or the given) unread notifications of a user as read in one statement"""
+        where, params = self._where(user=user, id=notification_ids)
+        with self._transaction() as conn:
+            marked = conn.execute(f"UPDATE notifications SET read = 1{where} AND read = 0", params).rowcount
+            self._adjust_inbox(conn, user, 0, -marked)
+        return marked
+
+    def _archive(self, conn, where, params):
+        archived_at = datetime.now().strftime("%Y-%m-%d %H:%M")
+        conn.execute(
+            f"INSERT INTO notifications_archive ({', '.join(NOTIFICATION_FIELDS)}, archived_at) "
+            f"SELECT {', '.join(NOTIFICATION_FIELDS)}, ? FROM notifications WHERE {where}",
+            (archived_at, *params)
+        )
+        for user, total, unread in conn.execute(
+            f"SELECT user, COUNT(*), SUM(read = 0) FROM notifications WHERE {where} GROUP BY user", params
+        ).fetchall():
+            self._adjust_inbox(conn, user, -total, -unread)
+        return conn.execute(f"DELETE FROM notifications WHERE {where}", params).rowcount
+
+    def archive_notifications(self, before_date):
+        """Move notifications dated before before_date to the archive"""
+        with self._transaction() as conn:
+            return self._archive(conn, "date < ?", (before_date,))
+
+    # Users
+    def get_user(self, username):
+        rows = self._query("SELECT * FROM users WHERE username = ?", (username,))
+        return dict(rows[0]) if rows else None
+
+    def list_users(self):
+        return [dict(row) for row in self._query("SELECT * FROM users ORDER BY username")]
+
+    def set_password(self, username, password_hash):
+        with self._transaction() as conn:
+            conn.execute("UPDATE users SET password = ? WHERE username = ?", (password_hash, username))
+
+    # Search
+    def search(self, table, text, scope=None, limit=SEARCH_RESULT_LIMIT):
+        """Best BM25 matches for text in one table, limited to the scope's partners
+
+        Each row carries the record plus highlighted title and body snippet,
+        with matches wrapped in SEARCH_MARKS.
+        """
+        match = self._match_expression(text)
+        if not match:
+            return []
+        
+        if table == "documents":
+            where, params = self._where(value=scope)
+            if params:
+                # Documents shared with everyone hold "All Partners" rather than a list of partners
+                where = where.replace(" WHERE ", " WHERE value = ? OR ", 1)
+                params = ["All Partners"] + params
+            scope_sql = f" AND EXISTS (SELECT 1 FROM json_each(r.shared_with){where})" if where else ""
+        else:
+            where, params = self._where("r.", **{"assigned_to" if table == "tasks" else "partner": scope})
+            scope_sql = where.replace(" WHERE ", " AND ", 1)
+        
+        # Rank first, then highlight only the rows that made the cut; title
+        # hits weigh more than hits in the longer body columns, ref isn't text
+        weights = ", ".join(["0", "5.0"] + ["1.0"] * (len(SEARCH_COLUMNS[table]) - 1))
+        join = f" JOIN {table} r ON r.id = {table}_fts.ref"
+        ranked = self._query(
+            f"SELECT {table}_fts.rowid, bm25({table}_fts, {weights}) AS score FROM {table}_fts"
+            f"{join if scope_sql else ''} WHERE {table}_fts MATCH ?{scope_sql} ORDER BY score LIMIT ?",
+            [match] + params + [limit]
+        )
+        if not ranked:
+            return []
+        
+        start, end = SEARCH_MARKS
+        scores = {rowid: score for rowid, score in ranked}
+        rows = self._query(
+            f"SELECT {table}_fts.rowid AS fts_rowid, r.*, highlight({table}_fts, 1, ?, ?) AS title_match, "
+            f"snippet({table}_fts, -1, ?, ?, '…', {SEARCH_SNIPPET_TOKENS}) AS snippet "
+            f"FROM {table}_fts{join} WHERE {table}_fts MATCH ? "
+            f"AND {table}_fts.rowid IN ({', '.join('?' * len(scores))})",
+            [start, end, start, end, match] + list(scores)
+        )
+        results = [{**dict(row), "score": scores[row["fts_rowid"]]} for row in rows]
+        return sorted(results, key=lambda row: row["score"])
+
+    # Documents
+    def list_documents(self):
+        return [
+            {**dict(row), "shared_with": json.loads(row["shared_with"])}
+            for row in self._query("SELECT * FROM documents ORDER BY id")
+        ]
@@ -0,0 +1,120 @@
+"""Wall time, call count and allocation tracing for the hot paths"""
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+from pmt.constants import PROFILE_ALLOCATIONS, PROFILING
+
+
+class Tracer:
+    """Wall time, call counts and allocated bytes per named span
+
+    Totals are kept for the whole process; each script thread also collects
+    the spans of its current rerun. While disabled, span() hands out a shared
+    no-op context and traced functions call straight through.
+    """
+
+    def __init__(self, enabled=False, allocations=False):
+        self.enabled = enabled
+        self._totals = {}  # name -> [calls, seconds, allocated bytes]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.track_allocations(allocations)
+
+    @property
+    def allocations(self):
+        return tracemalloc.is_tracing()
+
+    def track_allocations(self, enabled):
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def span(self, name):
+        return self._span(name) if self.enabled else _NO_SPAN
+
+    @contextmanager
+    def _span(self, name):
+        allocations = tracemalloc.is_tracing()
+        before = tracemalloc.get_traced_memory()[0] if allocations else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            # Net growth of traced memory; a span that frees more than it keeps counts as 0
+            allocated = max(0, tracemalloc.get_traced_memory()[0] - before) if allocations else 0
+            self._record(name, seconds, allocated)
+
+    def _record(self, name, seconds, allocated):
+        profile = getattr(self._local, "profile", None)
+        if profile is not None:
+            stats = profile.setdefault(name, [0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] += allocated
+        with self._lock:
+            stats = self._totals.setdefault(name, [0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] += allocated
+
+    @contextmanager
+    def rerun(self, name="run_app"):
+        """Span for a whole script run; yields the per-span stats of this run, or None while disabled"""
+        if not self.enabled:
+            yield None
+            return
+        
+        profile = self._local.profile = {}
+        try:
+            with self._span(name):
+                yield profile
+        finally:
+            self._local.profile = None
+
+    def totals(self):
+        with self._lock:
+            return {name: tuple(stats) for name, stats in self._totals.items()}
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+    def prometheus(self):
+        """Process totals in the Prometheus text exposition format"""
+        totals = sorted(self.totals().items())
+        lines = []
+        for index, (metric, kind, help_text) in enumerate((
+            ("pmt_span_calls_total", "counter", "Calls of each traced span"),
+            ("pmt_span_seconds_total", "counter", "Wall time spent in each traced span"),
+            ("pmt_span_allocated_bytes_total", "counter", "Net bytes allocated in each traced span")
+        )):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, stats in totals:
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{metric}{{span="{label}"}} {stats[index]}')
+        return "\n".join(lines) + "\n"
+
+
+_NO_SPAN = nullcontext()
+
+TRACER = Tracer(PROFILING, PROFILE_ALLOCATIONS)
+
+def traced(name=None):
+    """Record calls of the decorated function as a span, under its own name by default"""
+    def decorate(fn):
+        span_name = name or fn.__name__
+        
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            with TRACER._span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
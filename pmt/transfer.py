@@ -0,0 +1,123 @@
+"""Streaming export encoders and import parsing/validation"""
+import csv
+import importlib.util
+import io
+import json
+from datetime import date
+
+from pmt.constants import (
+    EXPORT_FORMATS, IMPORT_BATCH_SIZE, PARTNERS, TASK_CATEGORIES, TASK_PRIORITIES, TASK_STATUS
+)
+from pmt.lazy import pa, pq
+from pmt.store import COMMENT_FIELDS, REPORT_FIELDS, TASK_FIELDS
+
+
+EXPORT_COLUMNS = {"tasks": TASK_FIELDS, "reports": REPORT_FIELDS, "comments": COMMENT_FIELDS}
+# Integer columns of each export kind; every other column is text
+EXPORT_INTEGER_COLUMNS = {"tasks": {"progress"}, "reports": set(), "comments": {"id", "parent_id"}}
+
+def export_schema(kind):
+    """Arrow schema of an export; declared up front because nullable columns can't be inferred from a row"""
+    return pa.schema([
+        (column, pa.int64() if column in EXPORT_INTEGER_COLUMNS[kind] else pa.string())
+        for column in EXPORT_COLUMNS[kind]
+    ])
+
+def encode_csv(kind, chunks):
+    columns = EXPORT_COLUMNS[kind]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def encode_jsonl(kind, chunks):
+    columns = EXPORT_COLUMNS[kind]
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows).encode()
+
+def encode_parquet(kind, chunks):
+    # One row group per chunk
+    schema = export_schema(kind)
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in chunks:
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+            schema=schema
+        ))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+EXPORT_ENCODERS = {"csv": encode_csv, "jsonl": encode_jsonl, "parquet": encode_parquet}
+
+def export_formats():
+    """Export formats available here; Parquet needs pyarrow"""
+    formats = dict(EXPORT_FORMATS)
+    if importlib.util.find_spec("pyarrow") is None:
+        formats.pop("Parquet")
+    return formats
+
+def parse_import(uploaded_file, fmt):
+    """Rows of an uploaded CSV, JSON Lines or Parquet file as dicts, read incrementally"""
+    if fmt == "parquet":
+        for batch in pq.ParquetFile(uploaded_file).iter_batches(batch_size=IMPORT_BATCH_SIZE):
+            yield from batch.to_pylist()
+        return
+    
+    text = io.TextIOWrapper(uploaded_file, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        yield from csv.DictReader(text)
+    else:
+        for line in text:
+            if line.strip():
+                yield json.loads(line)
+
+def validate_task(row, assigned_by):
+    """A task record built from an imported row, and the problems found in it"""
+    def text(key, default=""):
+        value = row.get(key)
+        return default if value is None else str(value).strip()
+    
+    task = {
+        "title": text("title"),
+        "description": text("description"),
+        "assigned_to": text("assigned_to"),
+        "assigned_by": text("assigned_by") or assigned_by,
+        "category": text("category"),
+        "start_date": text("start_date"),
+        "end_date": text("end_date"),
+        "status": text("status", "Not Started"),
+        "progress": text("progress", "0"),
+        "priority": text("priority", "Medium")
+    }
+    errors = []
+    if not task["title"]:
+        errors.append("title is required")
+    for key, allowed in (("assigned_to", PARTNERS), ("category", TASK_CATEGORIES),
+                         ("status", TASK_STATUS), ("priority", TASK_PRIORITIES)):
+        if task[key] not in allowed:
+            errors.append(f"unknown {key} {task[key]!r}")
+    try:
+        start, end = date.fromisoformat(task["start_date"]), date.fromisoformat(task["end_date"])
+    except ValueError:
+        errors.append("dates must be YYYY-MM-DD")
+    else:
+        if end < start:
+            errors.append("end date is before start date")
+    try:
+        task["progress"] = int(float(task["progress"]))
+    except (ValueError, OverflowError):
+        errors.append(f"progress {task['progress']!r} is not a number")
+    else:
+        if not 0 <= task["progress"] <= 100:
+            errors.append("progress must be between 0 and 100")
+    return task, errors